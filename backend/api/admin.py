@@ -10,7 +10,8 @@ class CompositionInlineAdmin(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'author', 'name', 'image', 'text',
-                    'get_ingredients', 'get_tags', 'get_fans', 'cooking_time')
+                    'get_ingredients', 'get_tags', 'fans_count',
+                    'cooking_time')
     list_display_links = ('pk', 'name',)
     search_fields = ('author__username', 'name', 'tags__name')
     list_filter = ('tags',)
@@ -27,10 +28,6 @@ class RecipeAdmin(admin.ModelAdmin):
         return ',\n'.join(obj.tags.values_list('name', flat=True))
     get_tags.short_description = 'тэги'
 
-    def get_fans(self, obj):
-        return obj.fans.count()
-    get_fans.short_description = 'фанаты'
-
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -0,0 +1,111 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import bump_versions, get_versions
+
+User = get_user_model()
+
+TOKEN_KEY = 'api:token:{}'
+AUTH_NAMESPACE = 'auth:{}'
+
+
+def get_cached_fields(model):
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.editable or field.primary_key
+    ]
+
+
+def dump_instance(instance):
+    return tuple(
+        getattr(instance, name) for name in get_cached_fields(type(instance)))
+
+
+def load_instance(model, values):
+    return model.from_db(
+        router.db_for_read(model), get_cached_fields(model), values)
+
+
+class TokenCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, *value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, user_id, value):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + settings.TOKEN_CACHE_TIMEOUT, user_id,
+                *value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for key in [
+                key for key, (_, entry_user_id, *_) in self.entries.items()
+                if entry_user_id == user_id
+            ]:
+                del self.entries[key]
+
+
+token_cache = TokenCache()
+
+
+def invalidate_token_cache(user_id):
+    transaction.on_commit(lambda: token_cache.discard_user(user_id))
+    if settings.TOKEN_CACHE_SHARED:
+        bump_versions(AUTH_NAMESPACE.format(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not settings.TOKEN_CACHE_TIMEOUT:
+            return super().authenticate_credentials(key)
+
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        shared = settings.TOKEN_CACHE_SHARED
+        entry = token_cache.get(digest)
+        local = entry is not None
+        if not local and shared:
+            entry = cache.get(TOKEN_KEY.format(digest))
+        if entry is not None:
+            user_id, version, user_values, token_values = entry
+            if not shared or get_versions(
+                    [AUTH_NAMESPACE.format(user_id)])[0] == version:
+                if not local:
+                    token_cache.set(digest, user_id, entry[1:])
+                user = load_instance(User, user_values)
+                token = load_instance(self.get_model(), token_values)
+                token.user = user
+                return user, token
+
+        user, token = super().authenticate_credentials(key)
+        version = get_versions(
+            [AUTH_NAMESPACE.format(user.pk)])[0] if shared else None
+        value = (version, dump_instance(user), dump_instance(token))
+        token_cache.set(digest, user.pk, value)
+        if shared:
+            cache.set(TOKEN_KEY.format(digest), (user.pk, *value),
+                      settings.TOKEN_CACHE_TIMEOUT)
+        return user, token
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+class ConnectionMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(Counter)
+
+    def add(self, alias, name, value=1):
+        with self.lock:
+            self.counters[alias][name] += value
+
+    def snapshot(self):
+        with self.lock:
+            counters = {
+                alias: dict(counter)
+                for alias, counter in self.counters.items()
+            }
+        for counter in counters.values():
+            opened = counter.get('opened', 0)
+            reused = counter.get('reused', 0) + counter.get(
+                'pool_checkouts', 0)
+            counter['saved_seconds'] = (
+                counter.get('setup_seconds', 0) / opened * reused
+                if opened else 0)
+        return counters
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+
+
+connection_metrics = ConnectionMetrics()
+
+
+def is_raw_connection_usable(connection):
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+class PooledDatabaseWrapperMixin:
+    pools = defaultdict(list)
+    pools_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected_at = None
+        self.used_at = None
+        self.reuse_checked = False
+        self.discard = False
+
+    @property
+    def pool_key(self):
+        return (self.alias, *(
+            self.settings_dict.get(key)
+            for key in ('ENGINE', 'NAME', 'HOST', 'PORT', 'USER')))
+
+    def is_expired(self, connected_at, used_at):
+        max_age = self.settings_dict['CONN_MAX_AGE']
+        idle_timeout = self.settings_dict.get('CONN_IDLE_TIMEOUT')
+        now = time.time()
+        return bool(
+            max_age is not None and now - connected_at >= max_age or
+            idle_timeout and now - used_at >= idle_timeout)
+
+    def take_pooled_connection(self):
+        while True:
+            with self.pools_lock:
+                pool = self.pools[self.pool_key]
+                if not pool:
+                    return None, None
+                connection, connected_at, used_at = pool.pop()
+            if (not self.is_expired(connected_at, used_at) and (
+                    not self.settings_dict.get('CONN_HEALTH_CHECKS') or
+                    is_raw_connection_usable(connection))):
+                return connection, connected_at
+            connection_metrics.add(self.alias, 'closed')
+            connection.close()
+
+    def return_to_pool(self):
+        pool_size = self.settings_dict.get('POOL_SIZE')
+        if (not pool_size or self.discard or self.in_atomic_block or
+                self.errors_occurred or not self.autocommit or
+                self.is_expired(self.connected_at, self.used_at)):
+            return False
+        with self.pools_lock:
+            pool = self.pools[self.pool_key]
+            if len(pool) >= pool_size:
+                return False
+            pool.append((self.connection, self.connected_at, self.used_at))
+        connection_metrics.add(self.alias, 'pool_returns')
+        return True
+
+    @classmethod
+    def clear_pools(cls):
+        with cls.pools_lock:
+            connections = [
+                connection
+                for pool in cls.pools.values() for connection, *_ in pool
+            ]
+            cls.pools.clear()
+        for connection in connections:
+            connection.close()
+
+    def get_new_connection(self, conn_params):
+        connection, self.connected_at = self.take_pooled_connection()
+        if connection is not None:
+            connection_metrics.add(self.alias, 'pool_checkouts')
+            return connection
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        connection_metrics.add(self.alias, 'opened')
+        connection_metrics.add(
+            self.alias, 'setup_seconds', time.perf_counter() - started)
+        self.connected_at = time.time()
+        return connection
+
+    def connect(self):
+        self.reuse_checked = True
+        self.discard = False
+        super().connect()
+        max_age = self.settings_dict['CONN_MAX_AGE']
+        if max_age is not None:
+            self.close_at = self.connected_at + max_age
+        self.used_at = time.time()
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.reuse_checked:
+            self.reuse_checked = True
+            if (self.settings_dict.get('CONN_HEALTH_CHECKS') and
+                    not self.is_usable()):
+                connection_metrics.add(self.alias, 'health_check_failures')
+                self.discard = True
+                self.close()
+            else:
+                connection_metrics.add(self.alias, 'reused')
+        super().ensure_connection()
+        self.used_at = time.time()
+
+    def close_if_unusable_or_obsolete(self):
+        self.reuse_checked = True
+        idle_timeout = self.settings_dict.get('CONN_IDLE_TIMEOUT')
+        if (self.connection is not None and idle_timeout and
+                time.time() - self.used_at >= idle_timeout):
+            connection_metrics.add(self.alias, 'closed_idle')
+            self.discard = True
+            self.close()
+        super().close_if_unusable_or_obsolete()
+        if (self.connection is not None and self.settings_dict.get(
+                'POOL_SIZE') and not self.in_atomic_block):
+            self.close()
+        self.reuse_checked = False
+
+    def _close(self):
+        if self.connection is not None and self.return_to_pool():
+            return None
+        connection_metrics.add(self.alias, 'closed')
+        return super()._close()
@@ -0,0 +1,112 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+VERSION_KEY = 'api:version:{}'
+RESPONSE_KEY = 'api:response:{}'
+CHANGES_KEY = 'api:changes:{}'
+CHANGES_TIMEOUT = 24 * 60 * 60
+CACHED_HEADERS = ('Content-Type', 'Vary', 'Allow')
+
+
+def get_versions(namespaces):
+    keys = [VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*namespaces):
+    def bump():
+        now = time.time()
+        cache.set_many({
+            VERSION_KEY.format(namespace): now for namespace in namespaces
+        }, None)
+    transaction.on_commit(bump)
+
+
+def log_changes(namespace, ids):
+    ids = list(ids)
+
+    def log():
+        if not settings.SHARED_CACHE:
+            bump_change_counter(namespace)
+            return
+        key = CHANGES_KEY.format(namespace)
+        cache.add(key, 0, None)
+        sequence = cache.incr(key)
+        cache.set(f'{key}:{sequence}', ids, CHANGES_TIMEOUT)
+    transaction.on_commit(log)
+
+
+def reset_changes(namespace):
+    def reset():
+        if not settings.SHARED_CACHE:
+            bump_change_counter(namespace)
+        else:
+            cache.delete(CHANGES_KEY.format(namespace))
+    transaction.on_commit(reset)
+
+
+def bump_change_counter(namespace):
+    from .models import ChangeCounter
+    ChangeCounter.objects.bump(namespace)
+
+
+def get_changes(namespace, since, limit):
+    key = CHANGES_KEY.format(namespace)
+    sequence = cache.get(key, 0)
+    if since is None or sequence < since or sequence - since > limit:
+        return sequence, None
+    entries = cache.get_many([
+        f'{key}:{number}' for number in range(since + 1, sequence + 1)])
+    if len(entries) != sequence - since:
+        return sequence, None
+    return sequence, {pk for ids in entries.values() for pk in ids}
+
+
+def get_response_key(request, versions):
+    fingerprint = '|'.join([
+        request.build_absolute_uri(),
+        request.META.get('HTTP_ACCEPT', ''),
+        *map(repr, versions),
+    ])
+    return RESPONSE_KEY.format(hashlib.sha1(fingerprint.encode()).hexdigest())
+
+
+def store_response(key, response, last_modified):
+    response['ETag'] = '"{}"'.format(
+        hashlib.sha1(response.content).hexdigest())
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'no-cache'
+    cache.set(key, {
+        'content': response.content,
+        'headers': {
+            header: response[header]
+            for header in (*CACHED_HEADERS, 'ETag', 'Last-Modified')
+            if response.has_header(header)
+        },
+    }, settings.API_CACHE_TIMEOUT)
+
+
+def get_cached_response(request, key, last_modified):
+    cached = cache.get(key)
+    if cached is None:
+        return None
+
+    response = HttpResponse(cached['content'])
+    for header, value in cached['headers'].items():
+        response[header] = value
+    response['Cache-Control'] = 'no-cache'
+    return get_conditional_response(
+        request, etag=cached['headers']['ETag'],
+        last_modified=last_modified, response=response)
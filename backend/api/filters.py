@@ -1,18 +1,98 @@
+from collections import defaultdict
+
+from django.db.models import Case, IntegerField, Value, When
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
+from .indexes import recipe_ingredient_index
 from .models import Recipe, Tag
+from .search import search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(filters.FilterSet):
-    is_favorited = filters.BooleanFilter()
-    is_in_shopping_cart = filters.BooleanFilter()
+    is_favorited = filters.BooleanFilter(
+        field_name='fans', method='filter_user_relation')
+    is_in_shopping_cart = filters.BooleanFilter(
+        field_name='buyers', method='filter_user_relation')
     tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug', to_field_name='slug', queryset=Tag.objects)
+        to_field_name='slug', queryset=Tag.objects, method='filter_tags')
+    tags_all = filters.ModelMultipleChoiceFilter(
+        to_field_name='slug', queryset=Tag.objects, method='filter_tags')
+    search = filters.CharFilter(method='filter_search')
+    ingredients_all = NumberInFilter(method='filter_ingredients')
+    ingredients_any = NumberInFilter(method='filter_ingredients')
+    ingredients_none = NumberInFilter(method='filter_ingredients')
+    missing_max = filters.NumberFilter(
+        method='filter_missing_max', min_value=0)
+
+    def filter_user_relation(self, queryset, name, value):
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        if value:
+            return queryset.filter(**{name: user})
+        return queryset.exclude(**{name: user})
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        if any(tag.bit is None for tag in value):
+            return self.filter_tags_by_relation(queryset, name, value)
+        mask = 0
+        for tag in value:
+            mask |= tag.mask
+        if name == 'tags_all':
+            return queryset.with_all_tags(mask)
+        return queryset.with_any_tags(mask)
+
+    def filter_tags_by_relation(self, queryset, name, value):
+        recipe_tags = Recipe.tags.through.objects
+        if name == 'tags_all':
+            for tag in value:
+                queryset = queryset.filter(id__in=recipe_tags.filter(
+                    tag=tag).values('recipe_id'))
+            return queryset
+        return queryset.filter(id__in=recipe_tags.filter(
+            tag__in=value).values('recipe_id'))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ingredients(self, queryset, name, value):
+        ingredient_ids = [int(pk) for pk in value]
+        if name == 'ingredients_all':
+            return queryset.filter(
+                id__in=recipe_ingredient_index.get_all(ingredient_ids))
+        recipe_ids = recipe_ingredient_index.get_any(ingredient_ids)
+        if name == 'ingredients_any':
+            return queryset.filter(id__in=recipe_ids)
+        return queryset.exclude(id__in=recipe_ids)
+
+    def filter_missing_max(self, queryset, name, value):
+        ingredient_ids = self.form.cleaned_data.get('ingredients_any')
+        if not ingredient_ids:
+            return queryset
+        missing = recipe_ingredient_index.get_missing(
+            [int(pk) for pk in ingredient_ids], int(value))
+        by_count = defaultdict(list)
+        for recipe_id, count in missing.items():
+            by_count[count].append(recipe_id)
+        return queryset.filter(id__in=missing).annotate(
+            missing_count=Case(
+                *[When(id__in=recipe_ids, then=Value(count))
+                  for count, recipe_ids in by_count.items()],
+                output_field=IntegerField())
+        ).order_by('missing_count', '-pub_date')
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'is_in_shopping_cart', 'author', 'tags']
+        fields = ['is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+                  'tags_all', 'search', 'ingredients_all', 'ingredients_any',
+                  'ingredients_none', 'missing_max']
 
 
 class IngredientFilter(SearchFilter):
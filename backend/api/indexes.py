@@ -0,0 +1,173 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .cache import get_changes, get_versions
+from .models import ChangeCounter, Composition, Ingredient
+from .replicas import use_primary
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._snapshot = None
+
+    def _build(self):
+        ingredients = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').order_by('id')
+        ]
+        by_name = sorted(
+            ((item['name'].casefold(), item) for item in ingredients),
+            key=lambda entry: entry[0])
+        return (ingredients, [key for key, _ in by_name],
+                [item for _, item in by_name])
+
+    def _get_snapshot(self):
+        version, = get_versions(['ingredient'])
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            with use_primary():
+                snapshot = (version, *self._build())
+            self._snapshot = snapshot
+        return snapshot[1:]
+
+    def all(self):
+        return self._get_snapshot()[0]
+
+    def search(self, query, limit):
+        _, keys, items = self._get_snapshot()
+        query = query.strip().casefold()
+        if not query:
+            return items[:limit]
+
+        results = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and len(results) < limit and
+               keys[position].startswith(query)):
+            results.append(items[position])
+            position += 1
+
+        for key, item in zip(keys, items):
+            if len(results) >= limit:
+                break
+            if query in key and not key.startswith(query):
+                results.append(item)
+
+        return results
+
+
+def contains(posting, pk):
+    position = bisect_left(posting, pk)
+    return position < len(posting) and posting[position] == pk
+
+
+class RecipeIngredientIndex:
+    changes_limit = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sequence = None
+        self._built_at = None
+        self._recipes = {}
+        self._postings = {}
+
+    def _load(self, recipe_ids=None):
+        compositions = Composition.objects.order_by(
+            'recipe_id', 'ingredient_id')
+        if recipe_ids is not None:
+            compositions = compositions.filter(recipe_id__in=recipe_ids)
+        recipes = defaultdict(lambda: array('I'))
+        for recipe_id, ingredient_id in compositions.values_list(
+                'recipe_id', 'ingredient_id').iterator():
+            recipes[recipe_id].append(ingredient_id)
+        return recipes
+
+    def _rebuild(self):
+        recipes = self._load()
+        postings = defaultdict(lambda: array('I'))
+        for recipe_id, ingredient_ids in recipes.items():
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id].append(recipe_id)
+        self._recipes, self._postings = dict(recipes), dict(postings)
+
+    def _update(self, recipe_ids):
+        fresh = self._load(recipe_ids)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                posting = self._postings[ingredient_id]
+                del posting[bisect_left(posting, recipe_id)]
+            if recipe_id in fresh:
+                self._recipes[recipe_id] = fresh[recipe_id]
+                for ingredient_id in fresh[recipe_id]:
+                    insort(self._postings.setdefault(
+                        ingredient_id, array('I')), recipe_id)
+
+    def _is_expired(self):
+        return (self._built_at is None or
+                time.monotonic() - self._built_at > settings.RECIPE_INDEX_TTL)
+
+    def _refresh(self):
+        with use_primary():
+            if settings.SHARED_CACHE:
+                sequence, changed = get_changes(
+                    'composition', self._sequence, self.changes_limit)
+            else:
+                sequence = ChangeCounter.objects.get_value('composition')
+                changed = None if sequence != self._sequence else set()
+            if changed is None or self._is_expired():
+                self._rebuild()
+                self._built_at = time.monotonic()
+            elif changed:
+                self._update(changed)
+        self._sequence = sequence
+
+    def _get_postings(self, ingredient_ids):
+        return [
+            self._postings.get(ingredient_id, array('I'))
+            for ingredient_id in set(ingredient_ids)
+        ]
+
+    def get_all(self, ingredient_ids):
+        with self._lock:
+            self._refresh()
+            postings = sorted(
+                self._get_postings(ingredient_ids), key=len)
+            if not postings:
+                return []
+            smallest, others = postings[0], postings[1:]
+            return [
+                pk for pk in smallest
+                if all(contains(posting, pk) for posting in others)
+            ]
+
+    def get_any(self, ingredient_ids):
+        with self._lock:
+            self._refresh()
+            return sorted({
+                pk for posting in self._get_postings(ingredient_ids)
+                for pk in posting
+            })
+
+    def get_missing(self, ingredient_ids, missing_max):
+        with self._lock:
+            self._refresh()
+            matched = Counter(
+                pk for posting in self._get_postings(ingredient_ids)
+                for pk in posting)
+            missing = {
+                pk: len(self._recipes[pk]) - count
+                for pk, count in matched.items()
+            }
+        return {
+            pk: count for pk, count in missing.items()
+            if count <= missing_max
+        }
+
+
+ingredient_index = IngredientIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,190 @@
+import logging
+import os
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+LATENCY_KEY = 'api:latency:{}:{}:{}:{}'
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, None)
+LATENCY_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+LATENCY_PERCENTILES = (50, 95, 99)
+SLOW_REQUEST_QUERIES = 20
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+def get_route_names(patterns, namespace=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_route_names(
+                pattern.url_patterns,
+                f'{namespace}{pattern.namespace}:' if pattern.namespace
+                else namespace)
+        elif pattern.name:
+            yield namespace + pattern.name
+
+
+def get_origin():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR) and filename != __file__
+                and 'site-packages' not in filename):
+            return (f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                    f'{frame.f_lineno} {frame.f_code.co_name}')
+        frame = frame.f_back
+    return None
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.add('db', duration)
+            self.queries.append((duration, sql, get_origin()))
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def get_header(self, total):
+        metrics = [f'total;dur={total * 1000:.1f}']
+        for name, duration in self.durations.items():
+            metric = f'{name};dur={duration * 1000:.1f}'
+            if name == 'db':
+                metric += f';desc="{len(self.queries)} queries"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timer(name):
+    timings = current_timings.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - started)
+
+
+def record_latency(method, view_name, duration):
+    bucket = next(
+        bound for bound in LATENCY_BUCKETS
+        if bound is None or duration <= bound)
+    minute = int(time.time() // 60)
+    key = LATENCY_KEY.format(minute, method, view_name, bucket or 'inf')
+    try:
+        cache.incr(key)
+    except ValueError:
+        timeout = (settings.LATENCY_WINDOW + 1) * 60
+        cache.add(key, 0, timeout)
+        try:
+            cache.incr(key)
+        except ValueError:
+            return
+        cache.set(LATENCY_KEY.format(minute, method, view_name, 'seen'),
+                  True, timeout)
+
+
+def get_percentile(counts, percentile):
+    total = sum(counts.values())
+    seen = 0
+    for bound, count in counts.items():
+        seen += count
+        if seen * 100 >= total * percentile:
+            return bound
+    return None
+
+
+def get_latency_histograms():
+    slot = int(time.time() // 60)
+    labels = {
+        LATENCY_KEY.format(minute, method, view_name, 'seen'): (
+            minute, method, view_name)
+        for minute in range(slot - settings.LATENCY_WINDOW + 1, slot + 1)
+        for view_name in set(get_route_names(get_resolver().url_patterns))
+        for method in LATENCY_METHODS
+    }
+    keys = {}
+    for key in cache.get_many(labels):
+        minute, method, view_name = labels[key]
+        for bound in LATENCY_BUCKETS:
+            keys[LATENCY_KEY.format(minute, method, view_name,
+                                    bound or 'inf')] = (
+                f'{method} {view_name}', bound)
+    histograms = {}
+    for key, count in cache.get_many(keys).items():
+        label, bound = keys[key]
+        histograms.setdefault(
+            label, dict.fromkeys(LATENCY_BUCKETS, 0))[bound] += count
+    return {
+        label: {
+            'count': sum(counts.values()),
+            **{f'p{percentile}': get_percentile(counts, percentile)
+               for percentile in LATENCY_PERCENTILES},
+            'buckets': {
+                str(bound or 'inf'): count for bound, count in counts.items()
+            },
+        }
+        for label, counts in sorted(histograms.items())
+    }
+
+
+def log_slow_request(request, timings, total):
+    queries = sorted(timings.queries, key=lambda query: -query[0])
+    logger.warning(
+        'Медленный запрос %s %s: %.1f мс, запросов к базе %s (%.1f мс)%s',
+        request.method, request.get_full_path(), total * 1000,
+        len(timings.queries), timings.durations.get('db', 0) * 1000,
+        ''.join(
+            f'\n{duration * 1000:.1f} мс {origin}\n    {sql}'
+            for duration, sql, origin in queries[:SLOW_REQUEST_QUERIES]))
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        total = time.perf_counter() - timings.started
+        response['Server-Timing'] = timings.get_header(total)
+        if request.resolver_match is not None:
+            record_latency(
+                request.method, request.resolver_match.view_name,
+                total * 1000)
+        if total * 1000 >= settings.SLOW_REQUEST_THRESHOLD:
+            log_slow_request(request, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = current_timings.get()
+        started = time.perf_counter()
+        response.add_post_render_callback(lambda response: timings.add(
+            'render', time.perf_counter() - started))
+        return response
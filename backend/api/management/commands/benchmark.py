@@ -0,0 +1,191 @@
+import json
+import os
+import platform
+import statistics
+import time
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, F, Prefetch, Sum
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import Composition, Recipe, ShoppingCartTotal
+from api.renderers import TextShoppingCartRenderer
+from api.serializers import (
+    RecipeBodySerializer, RecipeMinifiedSerializer, RecipeSerializer,
+    UserWithRecipesSerializer)
+from api.synthetic import generate_dataset
+from users.serializers import UserSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет основные выборки и сериализаторы на синтетических '
+            'данных и сохраняет результаты в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--skew', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--page-size', type=int, default=25)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--output',
+            help='Файл результатов, по умолчанию benchmarks/<время>.json')
+        parser.add_argument(
+            '--compare', help='Файл результатов предыдущего запуска')
+
+    def handle(self, *args, **options):
+        self.options = options
+        dataset = {
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'skew': options['skew'],
+            'seed': options['seed'],
+            'page_size': options['page_size'],
+        }
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                    API_CACHE_TIMEOUT=0, DATABASE_REPLICAS=[],
+                    CACHES={'default': {
+                        'BACKEND':
+                            'django.core.cache.backends.dummy.DummyCache'}}):
+                generate_dataset(
+                    users=options['users'], recipes=options['recipes'],
+                    skew=options['skew'], seed=options['seed'],
+                    batch_size=1000)
+                results = self.run_benchmarks()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': options['repeat'],
+            'dataset': dataset,
+            'results': results,
+        }
+        path = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks',
+            timezone.now().strftime('%Y%m%d-%H%M%S') + '.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+            if previous.get('dataset') != dataset:
+                self.stderr.write(
+                    'Параметры данных отличаются от сравниваемого запуска')
+            previous = previous.get('results', {})
+        self.print_results(results, previous)
+        self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {path}'))
+
+    def measure(self, function):
+        timings = []
+        for _ in range(self.options['repeat']):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+        with CaptureQueriesContext(connection) as queries:
+            function()
+        return {
+            'min_ms': round(min(timings), 3),
+            'median_ms': round(statistics.median(timings), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': len(queries),
+        }
+
+    def run_benchmarks(self):
+        page_size = self.options['page_size']
+        reader = User.objects.annotate(
+            cart_size=Count('in_shopping_cart')
+        ).order_by('-cart_size', 'id').first()
+        if reader is None:
+            raise CommandError('Нет данных для замеров')
+        request = Request(APIRequestFactory().get('/'))
+        request.user = reader
+        context = {'request': request}
+
+        recipes = list(Recipe.objects.add_user_annotations(
+            reader.id
+        ).select_related('author').prefetch_related(
+            'composition__ingredient', 'tags'
+        ).order_by('-pub_date', '-id')[:page_size])
+        subscribed = set(reader.subscribed.values_list('id', flat=True))
+        for recipe in recipes:
+            recipe.author.is_subscribed = recipe.author_id in subscribed
+        authors = list(User.objects.add_is_subscribed_annotation(
+            reader.id
+        ).annotate(recipes_total=Count('recipes')).order_by(
+            '-recipes_total', 'id'
+        ).prefetch_related(Prefetch(
+            'recipes', queryset=Recipe.objects.latest_per_author(3),
+            to_attr='latest_recipes'))[:page_size])
+
+        renderer = TextShoppingCartRenderer()
+        benchmarks = {
+            'queryset.recipes.add_user_annotations': lambda: list(
+                Recipe.objects.add_user_annotations(reader.id).values_list(
+                    'id', 'is_favorited', 'is_in_shopping_cart')),
+            'queryset.users.add_is_subscribed_annotation': lambda: list(
+                User.objects.add_is_subscribed_annotation(
+                    reader.id).values_list('id', 'is_subscribed')),
+            'queryset.shopping_cart.totals': lambda: ''.join(
+                renderer.stream(ShoppingCartTotal.objects.filter(
+                    user=reader).values(
+                    name=F('ingredient__name'),
+                    unit=F('ingredient__measurement_unit'),
+                    amount=F('total_amount')).order_by('name').iterator())),
+            'queryset.shopping_cart.aggregate': lambda: ''.join(
+                renderer.stream(Composition.objects.filter(
+                    recipe__buyers=reader).values(
+                    name=F('ingredient__name'),
+                    unit=F('ingredient__measurement_unit')).annotate(
+                    amount=Sum('amount')).order_by('name').iterator())),
+            'serializer.recipe': lambda: RecipeSerializer(
+                recipes, many=True, context=context).data,
+            'serializer.recipe_body': lambda: RecipeBodySerializer(
+                recipes, many=True, context=context).data,
+            'serializer.recipe_minified': lambda: RecipeMinifiedSerializer(
+                recipes, many=True, context=context).data,
+            'serializer.user': lambda: UserSerializer(
+                authors, many=True, context=context).data,
+            'serializer.user_with_recipes': lambda:
+                UserWithRecipesSerializer(
+                    authors, many=True, context=context).data,
+        }
+        return {
+            name: self.measure(function)
+            for name, function in benchmarks.items()
+        }
+
+    def print_results(self, results, previous):
+        self.stdout.write(
+            f'{"замер":<45} {"медиана, мс":>12} {"мин, мс":>9} '
+            f'{"запросов":>8} {"изменение":>10}')
+        for name, result in results.items():
+            change = ''
+            before = previous.get(name)
+            if before and before['median_ms']:
+                ratio = result['median_ms'] / before['median_ms'] - 1
+                change = f'{ratio:+.1%}'
+            self.stdout.write(
+                f'{name:<45} {result["median_ms"]:>12.3f} '
+                f'{result["min_ms"]:>9.3f} {result["queries"]:>8} '
+                f'{change:>10}')
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.backends.pool import PooledDatabaseWrapperMixin, connection_metrics
+from api.models import Tag
+
+MODES = {
+    'new': {'CONN_MAX_AGE': 0, 'POOL_SIZE': 0},
+    'persistent': {'CONN_MAX_AGE': 600, 'POOL_SIZE': 0},
+    'pool': {'CONN_MAX_AGE': 600, 'POOL_SIZE': None},
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время дешёвых запросов без переиспользования '
+            'соединений, с постоянными соединениями и с пулом')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Количество потоков, как у gthread-воркера gunicorn')
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not isinstance(connection, PooledDatabaseWrapperMixin):
+            raise CommandError(
+                'Нужен DB_ENGINE=api.backends.postgresql или '
+                'api.backends.sqlite3')
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in ('CONN_MAX_AGE',
+                                                         'POOL_SIZE')}
+        self.stdout.write(
+            f'{"режим":<11} {"мс/запрос":>10} {"открыто":>8} '
+            f'{"повторно":>9} {"из пула":>8} {"установка, мс":>14} '
+            f'{"сэкономлено, мс":>16}')
+        try:
+            for mode in options['modes']:
+                settings_dict.update(MODES[mode])
+                if settings_dict['POOL_SIZE'] is None:
+                    settings_dict['POOL_SIZE'] = options['threads']
+                self.run(mode, options)
+        finally:
+            settings_dict.update(saved)
+
+    def serve(self, alias, count):
+        for _ in range(count):
+            request_started.send(sender=self.__class__)
+            try:
+                list(Tag.objects.using(alias).all()[:1])
+            finally:
+                request_finished.send(sender=self.__class__)
+        connections.close_all()
+
+    def run(self, mode, options):
+        connections.close_all()
+        PooledDatabaseWrapperMixin.clear_pools()
+        connection_metrics.reset()
+        threads = [
+            threading.Thread(target=self.serve, args=(
+                options['database'],
+                options['requests'] // options['threads']))
+            for _ in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        PooledDatabaseWrapperMixin.clear_pools()
+
+        metrics = connection_metrics.snapshot().get(options['database'], {})
+        served = options['requests'] // options['threads'] * len(threads)
+        self.stdout.write(
+            f'{mode:<11} {elapsed * 1000 / served:>10.3f} '
+            f'{metrics.get("opened", 0):>8} {metrics.get("reused", 0):>9} '
+            f'{metrics.get("pool_checkouts", 0):>8} '
+            f'{metrics.get("setup_seconds", 0) * 1000:>14.1f} '
+            f'{metrics.get("saved_seconds", 0) * 1000:>16.1f}')
@@ -0,0 +1,102 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import FeedEntry, Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает ленту подписок на чтении (pull) и на записи '
+            '(fanout) и оценивает точку окупаемости fanout')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers', type=int, nargs='+', default=[10, 100, 1000],
+            help='Количество подписчиков у автора')
+        parser.add_argument(
+            '--followed', type=int, nargs='+', default=[10, 50, 200],
+            help='Количество авторов, на которых подписан читатель')
+        parser.add_argument('--recipes-per-author', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write(
+            'подписчиков  подписок  pull, мс  fanout, мс  '
+            'запись fanout, мс  окупается после чтений')
+        for followers in options['followers']:
+            for followed in options['followed']:
+                with transaction.atomic():
+                    self.run(followers, followed)
+                    transaction.set_rollback(True)
+
+    def create_users(self, count):
+        prefix = uuid.uuid4().hex[:8]
+        User.objects.bulk_create([
+            User(username=f'bench-{prefix}-{index}',
+                 email=f'bench-{prefix}-{index}@example.com')
+            for index in range(count)
+        ])
+        return list(User.objects.filter(
+            username__startswith=f'bench-{prefix}-'
+        ).values_list('id', flat=True))
+
+    def create_recipes(self, author_ids, count):
+        prefix = uuid.uuid4().hex[:8]
+        Recipe.objects.bulk_create([
+            Recipe(author_id=author_id, name=f'bench-{prefix}-{author_id}-'
+                                             f'{index}',
+                   text='', cooking_time=1)
+            for author_id in author_ids
+            for index in range(count)
+        ])
+        return Recipe.objects.filter(name__startswith=f'bench-{prefix}-')
+
+    def measure(self, function, prepare=lambda: None):
+        elapsed = 0
+        for _ in range(self.options['repeat']):
+            argument = prepare()
+            started = time.perf_counter()
+            function(argument)
+            elapsed += time.perf_counter() - started
+        return elapsed * 1000 / self.options['repeat']
+
+    def run(self, followers, followed):
+        subscriptions_model = User.subscribed.through
+        reader_id, *author_ids = self.create_users(followed + 1)
+        follower_ids = self.create_users(followers)
+        subscriptions_model.objects.bulk_create([
+            subscriptions_model(from_user_id=reader_id, to_user_id=author_id)
+            for author_id in author_ids
+        ] + [
+            subscriptions_model(from_user_id=follower_id,
+                                to_user_id=author_ids[0])
+            for follower_id in follower_ids
+        ])
+        FeedEntry.objects.add_recipes(self.create_recipes(
+            author_ids, self.options['recipes_per_author']))
+
+        page_size = self.options['page_size']
+        pull = self.measure(lambda _: list(Recipe.objects.filter(
+            author__in=subscriptions_model.objects.filter(
+                from_user_id=reader_id).values('to_user_id')
+        ).only('id', 'author_id', 'pub_date')[:page_size]))
+        fanout = self.measure(lambda _: list(FeedEntry.objects.filter(
+            user_id=reader_id
+        ).only('id', 'recipe_id', 'author_id', 'pub_date')[:page_size]))
+        write_cost = self.measure(
+            FeedEntry.objects.add_recipes,
+            lambda: self.create_recipes(author_ids[:1], 1))
+
+        saving = pull - fanout
+        crossover = (f'{write_cost / saving:.1f}' if saving > 0
+                     else 'никогда')
+        self.stdout.write(
+            f'{followers:>11}  {followed:>8}  {pull:>8.2f}  {fanout:>10.2f}  '
+            f'{write_cost:>17.2f}  {crossover:>22}')
@@ -0,0 +1,298 @@
+import difflib
+import os
+import re
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+import api.urls
+import users.urls
+from api.instrumentation import get_route_names
+from api.models import Ingredient, Recipe, Tag
+from api.synthetic import PASSWORD, generate_dataset
+
+User = get_user_model()
+
+IMAGE = ('data:image/gif;base64,'
+         'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7')
+
+ENDPOINTS = (
+    ('tag-list', 'get', {}, None, 2, False),
+    ('tag-detail', 'get', {'pk': '{tag}'}, None, 2, False),
+    ('ingredient-list', 'get', {}, {'name': 'ингр'}, 2, False),
+    ('ingredient-detail', 'get', {'pk': '{ingredient}'}, None, 2, False),
+    ('recipe-list', 'get', {}, {}, 7, True),
+    ('recipe-list', 'get', {}, {'is_favorited': 1, 'tags': 'tag-0'}, 8,
+     True),
+    ('recipe-list', 'get', {}, {'pagination': 'cursor'}, 6, True),
+    ('recipe-list', 'get', {}, {'search': 'синтетический рецепт'}, 7,
+     True),
+    ('recipe-list', 'post', {}, {
+        'name': 'Новый рецепт', 'text': 'Текст', 'cooking_time': 10,
+        'tags': ['{tag}'], 'image': IMAGE,
+        'ingredients': [{'id': '{ingredient}', 'amount': 10}]}, 20, False),
+    ('recipe-detail', 'get', {'pk': '{recipe}'}, None, 6, False),
+    ('recipe-detail', 'patch', {'pk': '{own_recipe}'}, {
+        'name': 'Изменённый рецепт', 'text': 'Текст', 'cooking_time': 5,
+        'tags': ['{tag}'], 'image': IMAGE,
+        'ingredients': [{'id': '{ingredient}', 'amount': 5}]}, 28, False),
+    ('recipe-detail', 'delete', {'pk': '{own_recipe}'}, None, 16, False),
+    ('recipe-favorite', 'get', {'pk': '{recipe}'}, None, 7, False),
+    ('recipe-favorite', 'delete', {'pk': '{favorite}'}, None, 6, False),
+    ('recipe-shopping-cart', 'get', {'pk': '{recipe}'}, None, 10, False),
+    ('recipe-shopping-cart', 'delete', {'pk': '{in_cart}'}, None, 8,
+     False),
+    ('recipe-favorite-batch', 'post', {}, {'ids': '{recipes}'}, 8, False),
+    ('recipe-shopping-cart-batch', 'post', {}, {'ids': '{recipes}'}, 11,
+     False),
+    ('recipe-download-shopping-cart', 'get', {}, {'format': 'txt'}, 2,
+     False),
+    ('recipe-feed', 'get', {}, {}, 6, True),
+    ('user-list', 'get', {}, {}, 3, True),
+    ('user-list', 'post', {}, {
+        'email': 'new@example.com', 'username': 'new-user',
+        'first_name': 'Имя', 'last_name': 'Фамилия',
+        'password': 'Sup3r-secret-pass'}, 5, False),
+    ('user-me', 'get', {}, None, 1, False),
+    ('user-detail', 'get', {'id': '{author}'}, None, 2, False),
+    ('user-subscriptions', 'get', {}, {'recipes_limit': 3}, 4, True),
+    ('user-subscribe', 'get', {'id': '{author}'}, None, 8, False),
+    ('user-subscribe', 'delete', {'id': '{subscribed}'}, None, 6, False),
+    ('user-subscribe-batch', 'post', {}, {'ids': '{authors}'}, 8, False),
+    ('user-set-password', 'post', {}, {
+        'current_password': PASSWORD,
+        'new_password': 'An0ther-secret-pass'}, 2, False),
+    ('login', 'post', {}, {'email': '{email}', 'password': PASSWORD}, 5,
+     False),
+    ('logout', 'post', {}, None, 3, False),
+)
+
+SKIPPED = {
+    'api-root': 'не обращается к базе',
+    'metrics-list': 'читает только кеш',
+    'metrics-connections': 'не обращается к базе',
+    'user-activation': 'активация по почте отключена',
+    'user-resend-activation': 'активация по почте отключена',
+    'user-reset-password': 'сброс по почте отключён',
+    'user-reset-password-confirm': 'сброс по почте отключён',
+    'user-reset-username': 'сброс по почте отключён',
+    'user-reset-username-confirm': 'сброс по почте отключён',
+    'user-set-username': 'смена логина не используется фронтендом',
+}
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w\".])\d+(?:\.\d+)?(?![\w\"])")
+
+EXPLAIN_SQL = {
+    'postgresql': 'EXPLAIN (COSTS OFF) {}',
+    'sqlite': 'EXPLAIN QUERY PLAN {}',
+}
+
+
+def render(value, context):
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}'):
+            return context[value[1:-1]]
+        return value
+    if isinstance(value, dict):
+        return {key: render(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render(item, context) for item in value]
+    return value
+
+
+def get_plan_key(name, method, data):
+    key = f'{name}-{method}'
+    if data and method == 'get':
+        key += ''.join(f'-{param}' for param in sorted(data))
+    return key
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все маршруты API на синтетических данных, '
+            'проверяет бюджет запросов и планы EXPLAIN')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=30)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument(
+            '--page-sizes', type=int, nargs='+', default=[2, 25])
+        parser.add_argument(
+            '--plans-dir',
+            default=os.path.join(settings.BASE_DIR, 'query_plans'))
+        parser.add_argument(
+            '--update-plans', action='store_true',
+            help='Перезаписать сохранённые планы запросов')
+
+    def handle(self, *args, **options):
+        routes = set(get_route_names(api.urls.urlpatterns)) | set(
+            get_route_names(users.urls.urlpatterns))
+        uncovered = routes - {name for name, *_ in ENDPOINTS} - set(SKIPPED)
+        if uncovered:
+            raise CommandError('Маршруты без бюджета запросов: ' + ', '.join(
+                sorted(uncovered)))
+
+        keys = [
+            get_plan_key(name, method, data)
+            for name, method, _, data, *_ in ENDPOINTS
+        ]
+        if len(keys) != len(set(keys)):
+            raise CommandError('Повторяющиеся ключи планов: ' + ', '.join(
+                sorted({key for key in keys if keys.count(key) > 1})))
+
+        old_name = connection.settings_dict['NAME']
+        media_root = tempfile.mkdtemp()
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                    API_CACHE_TIMEOUT=0, TOKEN_CACHE_TIMEOUT=0,
+                    DATABASE_REPLICAS=[], MEDIA_ROOT=media_root,
+                    CACHES={'default': {
+                        'BACKEND':
+                            'django.core.cache.backends.dummy.DummyCache'}}):
+                generate_dataset(
+                    users=options['users'],
+                    recipes=options['users'] * options['recipes_per_user'])
+                failures = self.check_endpoints(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены'))
+
+    def get_context(self):
+        reader = User.objects.order_by('id').first()
+        subscribed = set(reader.subscribed.values_list('id', flat=True))
+        favorites = set(reader.favorited.values_list('id', flat=True))
+        in_cart = set(reader.in_shopping_cart.values_list('id', flat=True))
+        authors = list(User.objects.exclude(
+            id__in=subscribed | {reader.id}).values_list('id', flat=True))
+        recipes = list(Recipe.objects.exclude(author=reader).exclude(
+            id__in=favorites | in_cart).values_list('id', flat=True))
+        return reader, {
+            'tag': Tag.objects.first().id,
+            'ingredient': Ingredient.objects.first().id,
+            'recipe': recipes[0],
+            'recipes': recipes[:10],
+            'own_recipe': reader.recipes.first().id,
+            'favorite': min(favorites),
+            'in_cart': min(in_cart),
+            'author': authors[0],
+            'authors': authors[:10],
+            'subscribed': min(subscribed),
+            'email': reader.email,
+        }
+
+    def request(self, client, method, url, data):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(url, data, format=(
+                    None if method == 'get' else 'json'))
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            plans = self.explain(queries) if response.status_code < 400 else []
+            transaction.set_rollback(True)
+        return response, queries.captured_queries, plans
+
+    def explain(self, queries):
+        template = EXPLAIN_SQL.get(connection.vendor)
+        if template is None:
+            return []
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(template.format(sql))
+                plans.append('\n'.join([
+                    sql, *('    ' + ' '.join(map(str, row))
+                           for row in cursor.fetchall())]))
+        return plans
+
+    def check_endpoints(self, options):
+        reader, context = self.get_context()
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=reader)}')
+
+        plans_dir = os.path.join(options['plans_dir'], connection.vendor)
+        compare = options['update_plans'] or os.path.isdir(plans_dir)
+        if not compare:
+            self.stdout.write(self.style.WARNING(
+                f'Нет сохранённых планов {plans_dir}, '
+                f'сравнение планов пропущено'))
+
+        failures = []
+        for endpoint in ENDPOINTS:
+            name, method, kwargs, data, budget, paginated = endpoint
+            url = reverse(name, kwargs=render(kwargs, context))
+            data = render(data, context)
+            label = f'{method.upper()} {url}'
+            if data and method == 'get':
+                label += '?' + '&'.join(f'{k}={v}' for k, v in data.items())
+
+            page_sizes = options['page_sizes'] if paginated else [None]
+            counts = []
+            for page_size in page_sizes:
+                params = dict(data or {})
+                if page_size is not None:
+                    params['limit'] = page_size
+                response, queries, plans = self.request(
+                    client, method, url, params or data)
+                count = len(queries)
+                counts.append(count)
+                if options['verbosity'] > 1:
+                    for query in queries:
+                        self.stdout.write(f'    {query["sql"][:200]}')
+                if response.status_code >= 400:
+                    failures.append(
+                        f'{label}: ответ {response.status_code}')
+            status = 'OK'
+            if max(counts) > budget:
+                status = 'FAIL'
+                failures.append(
+                    f'{label}: {max(counts)} запросов при бюджете {budget}')
+            if len(set(counts)) > 1:
+                status = 'FAIL'
+                failures.append(
+                    f'{label}: число запросов зависит от размера страницы '
+                    f'{dict(zip(page_sizes, counts))}')
+            self.stdout.write(
+                f'{status:<4} {"/".join(map(str, counts)):>7} '
+                f'из {budget:<3} {label}')
+            if compare:
+                failures.extend(self.compare_plans(
+                    plans_dir, get_plan_key(name, method, data), label, plans,
+                    options))
+        return failures
+
+    def compare_plans(self, plans_dir, key, label, plans, options):
+        path = os.path.join(plans_dir, f'{key}.txt')
+        content = LITERALS.sub('?', '\n\n'.join([label, *plans])) + '\n'
+        if options['update_plans']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            return []
+        if not os.path.exists(path):
+            return [f'{label}: нет сохранённого плана {path}']
+        with open(path, encoding='utf-8') as file:
+            saved = file.read()
+        if saved == content:
+            return []
+        diff = StringIO()
+        diff.writelines(difflib.unified_diff(
+            saved.splitlines(True), content.splitlines(True), path, 'new'))
+        return [f'{label}: план запросов изменился\n{diff.getvalue()}']
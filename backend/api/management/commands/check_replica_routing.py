@@ -0,0 +1,161 @@
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.backends.pool import PooledDatabaseWrapperMixin
+from api.models import Recipe
+from api.synthetic import generate_dataset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Проверяет чтение с реплик и липкость чтения к основной базе '
+            'после записи на временных SQLite-базах')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=50)
+
+    def handle(self, *args, **options):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError(
+                'Реплики не настроены, задайте DB_REPLICA_NAMES')
+        for alias in (DEFAULT_DB_ALIAS, *replicas):
+            connection = connections[alias]
+            if connection.vendor != 'sqlite':
+                raise CommandError(
+                    f'{alias}: проверка рассчитана на базы SQLite')
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.use_databases_in(directory), override_settings(
+                    API_CACHE_TIMEOUT=0, TOKEN_CACHE_TIMEOUT=0,
+                    REPLICA_STICKY_SECONDS=1, CACHES={'default': {
+                        'BACKEND':
+                            'django.core.cache.backends.locmem.LocMemCache',
+                        'LOCATION': 'check-replica-routing'}}):
+                call_command('migrate', verbosity=0)
+                generate_dataset(
+                    users=options['users'], recipes=options['recipes'])
+                self.replicate()
+                failures = self.check_routing()
+
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Маршрутизация чтения верна'))
+
+    def close_connections(self):
+        connections.close_all()
+        PooledDatabaseWrapperMixin.clear_pools()
+
+    @contextmanager
+    def use_databases_in(self, directory):
+        aliases = (DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS)
+        names = {
+            alias: connections[alias].settings_dict['NAME']
+            for alias in aliases
+        }
+        self.close_connections()
+        for alias in aliases:
+            connections[alias].settings_dict['NAME'] = os.path.join(
+                directory, f'{alias}.sqlite3')
+        try:
+            yield
+        finally:
+            self.close_connections()
+            for alias, name in names.items():
+                connections[alias].settings_dict['NAME'] = name
+
+    def replicate(self):
+        self.close_connections()
+        for alias in settings.DATABASE_REPLICAS:
+            shutil.copyfile(
+                connections[DEFAULT_DB_ALIAS].settings_dict['NAME'],
+                connections[alias].settings_dict['NAME'])
+
+    def get_client(self, user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        return client
+
+    def request(self, client, url):
+        aliases = (DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS)
+        contexts = [
+            CaptureQueriesContext(connections[alias]) for alias in aliases]
+        for context in contexts:
+            context.__enter__()
+        try:
+            response = client.get(url)
+        finally:
+            for context in reversed(contexts):
+                context.__exit__(None, None, None)
+        return response, len(contexts[0]), sum(map(len, contexts[1:]))
+
+    def report(self, failures, description, passed, primary, replica):
+        self.stdout.write(
+            f'{"OK" if passed else "FAIL":<4} {description} '
+            f'(основная: {primary}, реплики: {replica})')
+        if not passed:
+            failures.append(description)
+
+    def check_routing(self):
+        reader, other = User.objects.order_by('id')[:2]
+        recipe = Recipe.objects.exclude(author=reader).exclude(
+            fans=reader).order_by('id').first()
+        reader_client = self.get_client(reader)
+        other_client = self.get_client(other)
+        self.replicate()
+        detail_url = reverse('recipe-detail', args=[recipe.id])
+        favorite_url = reverse('recipe-favorite', args=[recipe.id])
+
+        failures = []
+        response, primary, replica = self.request(
+            reader_client, reverse('recipe-list'))
+        self.report(
+            failures, 'Список рецептов читается с реплики',
+            response.status_code == 200 and replica > 0, primary, replica)
+
+        response, primary, replica = self.request(reader_client, favorite_url)
+        self.report(
+            failures, 'Добавление в избранное пишет в основную базу',
+            response.status_code == 200 and primary > 0, primary, replica)
+
+        response, primary, replica = self.request(reader_client, detail_url)
+        self.report(
+            failures, 'После записи автор читает основную базу',
+            response.json()['is_favorited'] and replica == 0,
+            primary, replica)
+
+        response, primary, replica = self.request(other_client, detail_url)
+        self.report(
+            failures, 'Другие пользователи читают с реплики',
+            response.status_code == 200 and replica > 0, primary, replica)
+
+        time.sleep(settings.REPLICA_STICKY_SECONDS)
+        response, primary, replica = self.request(reader_client, detail_url)
+        self.report(
+            failures, 'После окна липкости автор читает отстающую реплику',
+            not response.json()['is_favorited'] and replica > 0,
+            primary, replica)
+
+        self.replicate()
+        response, primary, replica = self.request(reader_client, detail_url)
+        self.report(
+            failures, 'После репликации реплика видит запись',
+            response.json()['is_favorited'] and replica > 0,
+            primary, replica)
+        return failures
@@ -0,0 +1,79 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.cache import bump_versions
+from api.models import Recipe
+from api.storage import DIGEST_PATTERN, release_images
+from api.thumbnails import (
+    THUMBNAILS_DIR, generate_thumbnails, get_storage, get_thumbnail_names)
+
+IMAGES_DIR = Recipe._meta.get_field('image').upload_to.rstrip('/')
+
+
+class Command(BaseCommand):
+    help = ('Переносит изображения рецептов под имена по содержимому '
+            'и удаляет файлы, на которые не ссылается ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет перенесено и удалено')
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        images = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True).distinct()
+        moved = failed = 0
+        for name in list(images.iterator()):
+            if DIGEST_PATTERN.search(name):
+                continue
+            if not storage.exists(name):
+                failed += 1
+                self.stderr.write(f'{name}: файл не найден')
+                continue
+            moved += 1
+            if options['dry_run']:
+                self.stdout.write(f'{name}: будет перенесён')
+                continue
+            with storage.open(name) as file:
+                content_name = storage.save(name, file)
+            with transaction.atomic():
+                Recipe.objects.filter(image=name).update(image=content_name)
+                bump_versions('recipe')
+            release_images([name])
+            self.stdout.write(f'{name} -> {content_name}')
+            try:
+                generate_thumbnails(content_name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{content_name}: {error}')
+
+        referenced = set(images)
+        derived = {
+            thumbnail for name in referenced
+            for thumbnail in get_thumbnail_names(name)
+        }
+        orphans = [
+            name for name in self.walk(storage, IMAGES_DIR) +
+            self.walk(storage, THUMBNAILS_DIR)
+            if name not in referenced and name not in derived
+        ]
+        for name in orphans:
+            if options['dry_run']:
+                self.stdout.write(f'{name}: будет удалён')
+            else:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено: {moved}, удалено без ссылок: {len(orphans)}, '
+            f'ошибок: {failed}'))
+
+    def walk(self, storage, path):
+        if not storage.exists(path):
+            return []
+        directories, files = storage.listdir(path)
+        names = [posixpath.join(path, name) for name in files]
+        for directory in directories:
+            names += self.walk(storage, posixpath.join(path, directory))
+        return names
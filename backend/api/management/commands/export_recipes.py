@@ -0,0 +1,77 @@
+import json
+import sys
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+
+from api.models import Composition, Recipe
+
+
+def merge_by_recipe(recipes, *related):
+    groups = [groupby(rows, key=itemgetter('recipe_id')) for rows in related]
+    heads = [next(group, None) for group in groups]
+    for recipe in recipes:
+        items = []
+        for index, group in enumerate(groups):
+            while heads[index] is not None and heads[index][0] < recipe['id']:
+                heads[index] = next(group, None)
+            if heads[index] is not None and heads[index][0] == recipe['id']:
+                items.append(list(heads[index][1]))
+                heads[index] = next(group, None)
+            else:
+                items.append([])
+        yield recipe, items
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты в формате JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        recipes = Recipe.objects.order_by('id').values(
+            'id', 'name', 'text', 'cooking_time', 'image',
+            'author__username').iterator(chunk_size)
+        tags = Recipe.tags.through.objects.order_by(
+            'recipe_id', 'tag_id').values(
+            'recipe_id', 'tag__name').iterator(chunk_size)
+        compositions = Composition.objects.order_by(
+            'recipe_id', 'id').values(
+            'recipe_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount').iterator(chunk_size)
+
+        output = (sys.stdout if options['path'] == '-'
+                  else open(options['path'], 'w', encoding='utf-8'))
+        exported = 0
+        try:
+            for recipe, (recipe_tags, recipe_compositions) in merge_by_recipe(
+                    recipes, tags, compositions):
+                output.write(json.dumps({
+                    'name': recipe['name'],
+                    'author': recipe['author__username'],
+                    'text': recipe['text'],
+                    'cooking_time': recipe['cooking_time'],
+                    'image': recipe['image'] or None,
+                    'tags': [tag['tag__name'] for tag in recipe_tags],
+                    'ingredients': [
+                        {
+                            'name': composition['ingredient__name'],
+                            'measurement_unit': composition[
+                                'ingredient__measurement_unit'],
+                            'amount': composition['amount'],
+                        }
+                        for composition in recipe_compositions
+                    ],
+                }, ensure_ascii=False) + '\n')
+                exported += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(f'Выгружено рецептов: {exported}')
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Ingredient, Recipe, Tag
+from api.synthetic import PASSWORD, generate_dataset
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами и '
+            'связями с неравномерным (ципфовским) распределением')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Среднее количество ингредиентов в рецепте')
+        parser.add_argument(
+            '--subscriptions-per-user', type=int, default=10,
+            help='Среднее количество подписок пользователя')
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=20,
+            help='Среднее количество избранных рецептов')
+        parser.add_argument(
+            '--cart-per-user', type=int, default=5,
+            help='Среднее количество рецептов в списке покупок')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель закона Ципфа, 0 — равномерное распределение')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Очистить базу перед генерацией')
+
+    def handle(self, *args, **options):
+        if options['flush']:
+            call_command('flush', interactive=False, verbosity=0)
+        if any(model.objects.exists()
+               for model in (User, Recipe, Ingredient, Tag)):
+            raise CommandError(
+                'База данных не пуста, используйте --flush')
+
+        with transaction.atomic():
+            generate_dataset(
+                users=options['users'],
+                recipes=options['recipes'],
+                ingredients=options['ingredients'],
+                tags=options['tags'],
+                ingredients_per_recipe=options['ingredients_per_recipe'],
+                subscriptions_per_user=options['subscriptions_per_user'],
+                favorites_per_user=options['favorites_per_user'],
+                cart_per_user=options['cart_per_user'],
+                skew=options['skew'],
+                seed=options['seed'],
+                batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {User.objects.count()}, '
+            f'рецептов: {Recipe.objects.count()}. '
+            f'Пароль пользователей: {PASSWORD}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Recipe
+from api.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для уже загруженных изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать миниатюры, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        images = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True).distinct()
+        failed = 0
+        for image_name in images.iterator():
+            try:
+                generate_thumbnails(image_name, force=options['force'])
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{image_name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры обработаны, ошибок: {failed}'))
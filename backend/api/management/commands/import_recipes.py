@@ -0,0 +1,154 @@
+import json
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.cache import bump_versions, log_changes
+from api.models import Composition, FeedEntry, Ingredient, Recipe, Tag
+from api.search import update_search_index
+from api.serializers import RecipeImportSerializer
+from api.synthetic import insert
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Загружает рецепты из файла в формате JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create')
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Количество рецептов в одной транзакции')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        imported = skipped = 0
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                lines = (
+                    (number, line) for number, line in enumerate(file, 1)
+                    if line.strip())
+                while True:
+                    chunk = list(islice(lines, options['chunk_size']))
+                    if not chunk:
+                        break
+                    rows = []
+                    for number, line in chunk:
+                        try:
+                            rows.append((number, json.loads(line)))
+                        except ValueError as error:
+                            skipped += 1
+                            self.stderr.write(
+                                f'Строка {number}: неверный JSON: {error}')
+                    created, failed = self.import_chunk(rows)
+                    imported += created
+                    skipped += failed
+        finally:
+            if imported:
+                bump_versions('recipe')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {imported}, пропущено: {skipped}'))
+
+    def resolve(self, model, field, names):
+        return dict(model.objects.filter(
+            **{f'{field}__in': set(names)}).values_list(field, 'id'))
+
+    def validate(self, numbered_rows):
+        valid = []
+        for number, row in numbered_rows:
+            serializer = RecipeImportSerializer(data=row)
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                self.stderr.write(f'Строка {number}: ' + json.dumps(
+                    serializer.errors, ensure_ascii=False))
+        return valid
+
+    @transaction.atomic
+    def import_chunk(self, numbered_rows):
+        valid_rows = self.validate(numbered_rows)
+        rows = [row for _, row in valid_rows]
+        authors = self.resolve(
+            User, 'username', (row['author'] for row in rows))
+        tags = self.resolve(
+            Tag, 'name', (tag for row in rows for tag in row['tags']))
+        ingredients = self.resolve(
+            Ingredient, 'name', (ingredient['name'] for row in rows
+                                 for ingredient in row['ingredients']))
+        tag_masks = {
+            pk: 0 if bit is None else 1 << bit
+            for pk, bit in Tag.objects.filter(
+                id__in=tags.values()).values_list('id', 'bit')
+        }
+        existing = set(Recipe.objects.filter(
+            name__in=[row['name'] for row in rows]
+        ).values_list('name', flat=True))
+
+        accepted = []
+        for number, row in valid_rows:
+            missing = (
+                [row['author']] * (row['author'] not in authors)
+                + [tag for tag in row['tags'] if tag not in tags]
+                + [ingredient['name'] for ingredient in row['ingredients']
+                   if ingredient['name'] not in ingredients]
+            )
+            prefix = f'Строка {number}: {row["name"]}'
+            if row['name'] in existing:
+                self.stderr.write(f'{prefix}: рецепт уже существует')
+            elif missing:
+                self.stderr.write(
+                    f'{prefix}: не найдены {", ".join(missing)}')
+            else:
+                existing.add(row['name'])
+                accepted.append(row)
+
+        insert(Recipe, [
+            Recipe(
+                name=row['name'],
+                author_id=authors[row['author']],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=row.get('image'),
+                tags_mask=sum(
+                    tag_masks[tags[tag]] for tag in set(row['tags'])),
+            )
+            for row in accepted
+        ], batch_size=self.batch_size)
+        recipes = self.resolve(
+            Recipe, 'name', (row['name'] for row in accepted))
+        insert(Composition, [
+            Composition(
+                recipe_id=recipes[row['name']],
+                ingredient_id=ingredients[ingredient['name']],
+                amount=ingredient['amount'],
+            )
+            for row in accepted for ingredient in row['ingredients']
+        ], batch_size=self.batch_size)
+        tags_model = Recipe.tags.through
+        insert(tags_model, [
+            tags_model(recipe_id=recipes[row['name']], tag_id=tags[tag])
+            for row in accepted for tag in row['tags']
+        ], batch_size=self.batch_size)
+
+        update_search_index(list(recipes.values()))
+        log_changes('composition', recipes.values())
+        if settings.FEED_STRATEGY == 'fanout':
+            FeedEntry.objects.add_recipes(
+                Recipe.objects.filter(id__in=recipes.values()),
+                batch_size=self.batch_size)
+
+        recipes_count = Counter(authors[row['author']] for row in accepted)
+        for author_id, count in recipes_count.items():
+            User.objects.filter(pk=author_id).increment(
+                'recipes_count', count)
+
+        return len(accepted), len(numbered_rows) - len(accepted)
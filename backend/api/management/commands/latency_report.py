@@ -0,0 +1,35 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.instrumentation import LATENCY_PERCENTILES, get_latency_histograms
+
+
+class Command(BaseCommand):
+    help = ('Выводит гистограммы задержек по представлениям '
+            'за последние LATENCY_WINDOW минут')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        histograms = get_latency_histograms()
+        if options['json']:
+            self.stdout.write(json.dumps(histograms, indent=2))
+            return
+
+        self.stdout.write(
+            f'Окно: {settings.LATENCY_WINDOW} мин, верхние границы '
+            f'корзин в мс')
+        self.stdout.write(f'{"представление":<45} {"запросов":>8} ' + ' '.join(
+            f'{"p" + str(percentile):>6}'
+            for percentile in LATENCY_PERCENTILES))
+        for label, histogram in sorted(
+                histograms.items(),
+                key=lambda item: -(item[1]['p95'] or float('inf'))):
+            percentiles = ' '.join(
+                f'{str(histogram[f"p{percentile}"] or "inf"):>6}'
+                for percentile in LATENCY_PERCENTILES)
+            self.stdout.write(
+                f'{label:<45} {histogram["count"]:>8} {percentiles}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import FeedEntry, Recipe
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает таблицу лент подписок для стратегии fanout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        FeedEntry.objects.all().delete()
+        FeedEntry.objects.add_recipes(
+            Recipe.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(
+            f'Записей в лентах: {FeedEntry.objects.count()}')
@@ -0,0 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from api.models import ShoppingCartTotal
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает итоги списков покупок и проверяет их расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только проверить таблицу, не перестраивая её')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def get_expected_totals(self):
+        buyers_model = User.in_shopping_cart.through
+        rows = buyers_model.objects.filter(
+            recipe__composition__isnull=False
+        ).values_list(
+            'user_id', 'recipe__composition__ingredient_id'
+        ).annotate(Sum('recipe__composition__amount')).order_by()
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in rows
+        }
+
+    def get_stored_totals(self):
+        rows = ShoppingCartTotal.objects.values_list(
+            'user_id', 'ingredient_id', 'total_amount').order_by()
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in rows
+        }
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = self.get_expected_totals()
+            stored = self.get_stored_totals()
+            mismatches = {
+                key for key in expected.keys() | stored.keys()
+                if expected.get(key) != stored.get(key)
+            }
+
+            if options['verify']:
+                for user_id, ingredient_id in sorted(mismatches):
+                    self.stdout.write(
+                        f'user={user_id} ingredient={ingredient_id}: '
+                        f'ожидалось {expected.get((user_id, ingredient_id))}, '
+                        f'записано {stored.get((user_id, ingredient_id))}')
+                if mismatches:
+                    raise CommandError(
+                        f'Найдено расхождений: {len(mismatches)}')
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+
+            ShoppingCartTotal.objects.all().delete()
+            totals = [
+                ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id,
+                                  total_amount=amount)
+                for (user_id, ingredient_id), amount in expected.items()
+            ]
+            max_batch_size = connection.ops.bulk_batch_size(
+                ['user_id', 'ingredient_id', 'total_amount'], totals)
+            ShoppingCartTotal.objects.bulk_create(totals, batch_size=min(
+                options['batch_size'], max_batch_size) or None)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги перестроены: {len(expected)} записей, '
+            f'исправлено расхождений: {len(mismatches)}'))
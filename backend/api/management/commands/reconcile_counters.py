@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from api.models import Recipe, Tag
+from api.tags import get_free_bit, get_tags_masks, schedule_tag_index_update
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'fans_count', User.favorited.through, 'recipe_id'),
+    (Recipe, 'buyers_count', User.in_shopping_cart.through, 'recipe_id'),
+    (User, 'recipes_count', Recipe, 'author_id'),
+    (User, 'subscribers_count', User.subscribed.through, 'to_user_id'),
+    (User, 'subscriptions_count', User.subscribed.through, 'from_user_id'),
+    (User, 'favorites_count', User.favorited.through, 'user_id'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с данными и исправляет их'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, field, source, source_field in COUNTERS:
+            actual = source.objects.filter(
+                **{source_field: OuterRef('pk')}
+            ).order_by().values(source_field).annotate(
+                total=Count('*')).values('total')
+            with transaction.atomic():
+                drifted = [
+                    model(pk=pk, **{field: value})
+                    for pk, value in model.objects.annotate(
+                        actual=Coalesce(Subquery(actual), 0,
+                                        output_field=IntegerField())
+                    ).exclude(**{field: F('actual')}).values_list(
+                        'pk', 'actual')
+                ]
+                model.objects.bulk_update(
+                    drifted, [field], batch_size=options['batch_size'])
+
+            self.stdout.write(
+                f'{model._meta.label}.{field}: '
+                f'исправлено записей: {len(drifted)}')
+
+        self.reconcile_tags_masks(options['batch_size'])
+
+    @transaction.atomic
+    def reconcile_tags_masks(self, batch_size):
+        for tag in Tag.objects.filter(bit=None):
+            tag.bit = get_free_bit()
+            tag.save(update_fields=['bit'])
+        for bit in Tag.objects.exclude(bit=None).values_list(
+                'bit', flat=True):
+            schedule_tag_index_update(bit, create=True)
+
+        masks = get_tags_masks()
+        drifted = [
+            Recipe(pk=pk, tags_mask=masks.get(pk, 0))
+            for pk, tags_mask in Recipe.objects.values_list(
+                'pk', 'tags_mask').iterator()
+            if tags_mask != masks.get(pk, 0)
+        ]
+        Recipe.objects.bulk_update(
+            drifted, ['tags_mask'], batch_size=batch_size)
+        self.stdout.write(
+            f'api.Recipe.tags_mask: исправлено записей: {len(drifted)}')
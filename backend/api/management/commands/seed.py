@@ -0,0 +1,179 @@
+import csv
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.core import serializers
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from api.cache import bump_versions, reset_changes
+from api.models import Ingredient, SeedFingerprint
+from api.search import update_search_index
+
+
+def get_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Загружает фикстуры и ингредиенты, пропуская источники, '
+            'которые не изменились с прошлой загрузки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', default=settings.SEED_FIXTURES)
+        parser.add_argument(
+            '--ingredients', default=settings.SEED_INGREDIENTS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Загрузить данные, даже если они не изменились')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        sources = (
+            ('fixtures', options['fixtures'], self.load_fixtures),
+            ('ingredients', options['ingredients'], self.load_ingredients),
+        )
+        try:
+            hashes = {name: get_sha256(path) for name, path, _ in sources}
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать источник: {error}')
+        fingerprints = dict(SeedFingerprint.objects.filter(
+            source__in=hashes).values_list('source', 'sha256'))
+
+        changed = [
+            (name, path, load) for name, path, load in sources
+            if options['force'] or fingerprints.get(name) != hashes[name]
+        ]
+        if not changed:
+            self.stdout.write('Начальные данные не изменились')
+            return
+
+        for name, path, load in changed:
+            with transaction.atomic():
+                load(path)
+                SeedFingerprint.objects.update_or_create(
+                    source=name, defaults={'sha256': hashes[name]})
+
+        update_search_index()
+        reset_changes('composition')
+        call_command('rebuild_shopping_cart_totals', stdout=self.stdout)
+        call_command('reconcile_counters', stdout=self.stdout)
+        if settings.FEED_STRATEGY == 'fanout':
+            call_command('rebuild_feed', stdout=self.stdout)
+        bump_versions('recipe', 'tag', 'ingredient', 'user')
+
+    def load_fixtures(self, path):
+        objects = defaultdict(list)
+        relations = defaultdict(lambda: defaultdict(list))
+        with open(path, encoding='utf-8') as file:
+            for deserialized in serializers.deserialize('json', file):
+                instance = deserialized.object
+                objects[type(instance)].append(instance)
+                for field, pks in deserialized.m2m_data.items():
+                    relations[type(instance)][field].append(
+                        (instance.pk, pks))
+
+        for model, instances in objects.items():
+            self.upsert(model, instances)
+        for model, fields in relations.items():
+            for field, rows in fields.items():
+                self.replace_relations(model, field, rows)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), list(objects)):
+                cursor.execute(sql)
+
+        self.stdout.write(
+            f'Фикстуры: записей {sum(map(len, objects.values()))}')
+
+    def upsert(self, model, instances):
+        existing = set(model._base_manager.filter(
+            pk__in=[instance.pk for instance in instances]
+        ).values_list('pk', flat=True))
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key
+        ]
+        created = [
+            instance for instance in instances if instance.pk not in existing]
+        auto_now = [
+            field for field in fields
+            if getattr(field, 'auto_now', False)
+            or getattr(field, 'auto_now_add', False)
+        ]
+        values = [
+            [getattr(instance, field.attname) for field in auto_now]
+            for instance in created
+        ]
+        self.bulk_create(model._base_manager, created)
+        for instance, row in zip(created, values):
+            for field, value in zip(auto_now, row):
+                setattr(instance, field.attname, value)
+
+        updated = [
+            instance for instance in instances if instance.pk in existing]
+        if updated:
+            model._base_manager.bulk_update(
+                updated, [field.name for field in fields],
+                batch_size=self.batch_size)
+        if created and auto_now:
+            model._base_manager.bulk_update(
+                created, [field.name for field in auto_now],
+                batch_size=self.batch_size)
+
+    def bulk_create(self, manager, objs, **kwargs):
+        batch_size = self.batch_size
+        if objs:
+            batch_size = min(batch_size, connection.ops.bulk_batch_size(
+                [field.name for field in manager.model._meta.concrete_fields],
+                objs))
+        manager.bulk_create(objs, batch_size=batch_size or None, **kwargs)
+
+    def replace_relations(self, model, field, rows):
+        field = model._meta.get_field(field)
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        through._base_manager.filter(**{
+            f'{source}__in': [pk for pk, _ in rows]}).delete()
+        self.bulk_create(through._base_manager, [
+            through(**{f'{source}_id': pk, f'{target}_id': target_pk})
+            for pk, target_pks in rows for target_pk in target_pks
+        ])
+
+    def load_ingredients(self, path):
+        with open(path, encoding='utf-8', newline='') as file:
+            units = {
+                name: measurement_unit
+                for name, measurement_unit in csv.reader(file)
+            }
+        existing = dict(Ingredient.objects.filter(
+            name__in=units).values_list('name', 'measurement_unit'))
+
+        self.bulk_create(Ingredient.objects, [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in units.items()
+            if name not in existing
+        ], ignore_conflicts=True)
+        changed = [
+            name for name, measurement_unit in existing.items()
+            if units[name] != measurement_unit
+        ]
+        updated = list(Ingredient.objects.filter(name__in=changed))
+        for ingredient in updated:
+            ingredient.measurement_unit = units[ingredient.name]
+        Ingredient.objects.bulk_update(
+            updated, ['measurement_unit'], batch_size=self.batch_size)
+
+        self.stdout.write(
+            f'Ингредиенты: новых {len(units) - len(existing)}, '
+            f'обновлено {len(updated)}')
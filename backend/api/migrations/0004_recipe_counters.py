@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='buyers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fans_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Фанатов'),
+        ),
+    ]
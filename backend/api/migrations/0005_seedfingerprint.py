@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeedFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=200, unique=True, verbose_name='Источник')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('loaded', models.DateTimeField(auto_now=True, verbose_name='Загружено')),
+            ],
+            options={
+                'verbose_name': 'Отпечаток начальных данных',
+                'verbose_name_plural': 'Отпечатки начальных данных',
+                'ordering': ['id'],
+            },
+        ),
+    ]
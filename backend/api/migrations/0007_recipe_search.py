@@ -0,0 +1,56 @@
+from django.db import migrations
+
+CREATE_SQL = {
+    'postgresql': [
+        'ALTER TABLE api_recipe ADD COLUMN search_vector tsvector',
+        'CREATE INDEX recipe_search_vector_idx ON api_recipe '
+        'USING gin (search_vector)',
+        "UPDATE api_recipe AS recipe SET search_vector = "
+        "setweight(to_tsvector('russian', recipe.name), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(("
+        "SELECT string_agg(ingredient.name, ' ') "
+        "FROM api_composition composition "
+        "JOIN api_ingredient ingredient "
+        "ON ingredient.id = composition.ingredient_id "
+        "WHERE composition.recipe_id = recipe.id), '')), 'B') || "
+        "setweight(to_tsvector('russian', recipe.text), 'C')",
+    ],
+    'sqlite': [
+        'CREATE VIRTUAL TABLE api_recipe_search USING fts5('
+        "name, ingredients, text, tokenize = 'unicode61 remove_diacritics 2')",
+        'INSERT INTO api_recipe_search (rowid, name, ingredients, text) '
+        'SELECT recipe.id, recipe.name, coalesce(('
+        "SELECT group_concat(ingredient.name, ' ') "
+        'FROM api_composition composition '
+        'JOIN api_ingredient ingredient '
+        'ON ingredient.id = composition.ingredient_id '
+        "WHERE composition.recipe_id = recipe.id), ''), recipe.text "
+        'FROM api_recipe recipe',
+    ],
+}
+
+DROP_SQL = {
+    'postgresql': [
+        'DROP INDEX recipe_search_vector_idx',
+        'ALTER TABLE api_recipe DROP COLUMN search_vector',
+    ],
+    'sqlite': ['DROP TABLE api_recipe_search'],
+}
+
+
+def run_sql(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql(CREATE_SQL), run_sql(DROP_SQL)),
+    ]
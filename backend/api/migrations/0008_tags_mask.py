@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:57
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def fill_tags_masks(apps, schema_editor):
+    Tag = apps.get_model('api', 'Tag')
+    Recipe = apps.get_model('api', 'Recipe')
+    tags = list(Tag.objects.order_by('id')[:63])
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+
+    masks = {}
+    for recipe_id, bit in Recipe.tags.through.objects.filter(
+            tag__bit__isnull=False).values_list('recipe_id', 'tag__bit'):
+        masks[recipe_id] = masks.get(recipe_id, 0) | 1 << bit
+    Recipe.objects.bulk_update(
+        [Recipe(pk=pk, tags_mask=mask) for pk, mask in masks.items()],
+        ['tags_mask'], batch_size=500)
+
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for tag in tags:
+            schema_editor.execute(
+                f'CREATE INDEX recipe_tag_{tag.bit}_idx '
+                f'ON api_recipe (pub_date DESC, id DESC) '
+                f'WHERE (tags_mask & {1 << tag.bit}) > 0')
+
+
+def drop_tag_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for bit in range(63):
+            schema_editor.execute(f'DROP INDEX IF EXISTS recipe_tag_{bit}_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Битовая маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, validators=[django.core.validators.MaxValueValidator(62)], verbose_name='Бит в маске рецепта'),
+        ),
+        migrations.RunPython(fill_tags_masks, drop_tag_indexes),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:18
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_tags_mask'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, max_length=200, null=True, storage=api.storage.ContentAddressedStorage(), upload_to='api/', verbose_name='Изображение'),
+        ),
+    ]
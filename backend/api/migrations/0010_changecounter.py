@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(max_length=50, unique=True, verbose_name='Пространство')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Номер изменения')),
+            ],
+            options={
+                'verbose_name': 'Счётчик изменений',
+                'verbose_name_plural': 'Счётчики изменений',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,31 +1,197 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+from django.http import Http404
 from rest_framework.response import Response
 from rest_framework.status import HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST
 
+from .cache import (
+    get_cached_response, get_response_key, get_versions, store_response)
+from .models import FeedEntry, ShoppingCartTotal
+from .replicas import use_primary
+from .serializers import IdListSerializer
+
+User = get_user_model()
+
+
+class CachedResponseMixin:
+    cache_namespaces = ()
+    cache_actions = ('list', 'retrieve')
+    cache_anonymous_only = False
+
+    def is_response_cacheable(self, request):
+        return bool(
+            settings.API_CACHE_TIMEOUT and
+            self.action_map.get(request.method.lower()) in self.cache_actions
+            and not (self.cache_anonymous_only and
+                     'HTTP_AUTHORIZATION' in request.META))
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        versions = get_versions(self.cache_namespaces)
+        last_modified = int(max(versions))
+        key = get_response_key(request, versions)
+        response = get_cached_response(request, key, last_modified)
+        if response is not None:
+            return response
+
+        with use_primary():
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(
+                response, 'add_post_render_callback'):
+            response.add_post_render_callback(
+                lambda response: store_response(key, response, last_modified))
+        return response
+
 
 class RelEntryAddRemoveMixin:
-    def rel_entry_add_remove(self, request, related_name,
+    def get_relation(self, related_name):
+        field = User._meta.get_field(related_name)
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name())
+        target = through._meta.get_field(field.m2m_reverse_field_name())
+        return through, source, target, target.related_model
+
+    def execute_relation_sql(self, related_name, sql, params, ids,
+                             expected):
+        through, source, target, model = self.get_relation(related_name)
+        connection = connections[router.db_for_write(through)]
+        qn = connection.ops.quote_name
+        sql = sql.format(
+            insert=connection.ops.insert_statement(ignore_conflicts=True),
+            on_conflict=connection.ops.ignore_conflicts_suffix_sql(
+                ignore_conflicts=True),
+            through=qn(through._meta.db_table),
+            source=qn(source.column),
+            target=qn(target.column),
+            table=qn(model._meta.db_table),
+            pk=qn(model._meta.pk.column),
+            ids=', '.join(['%s'] * len(ids)),
+        )
+        returning = connection.features.can_return_ids_from_bulk_insert
+        if not returning and len(ids) > 1:
+            expected = expected()
+        with connection.cursor() as cursor:
+            if returning:
+                cursor.execute(
+                    f'{sql} RETURNING {qn(target.column)}', params)
+                return {row[0] for row in cursor.fetchall()}
+            cursor.execute(sql, params)
+            if len(ids) == 1:
+                return set(ids) if cursor.rowcount else set()
+            return expected
+
+    def get_linked_ids(self, user, related_name, ids):
+        through, source, target, _ = self.get_relation(related_name)
+        return set(through.objects.filter(**{
+            source.attname: user.pk, f'{target.attname}__in': ids,
+        }).values_list(target.attname, flat=True))
+
+    def link(self, user, related_name, ids):
+        if not ids:
+            return set()
+        return self.execute_relation_sql(
+            related_name,
+            '{insert} {through} ({source}, {target}) '
+            'SELECT %s, {pk} FROM {table} WHERE {pk} IN ({ids}) '
+            '{on_conflict}',
+            [user.pk, *ids], ids,
+            lambda: set(ids) - self.get_linked_ids(user, related_name, ids))
+
+    def unlink(self, user, related_name, ids):
+        if not ids:
+            return set()
+        return self.execute_relation_sql(
+            related_name,
+            'DELETE FROM {through} '
+            'WHERE {source} = %s AND {target} IN ({ids})',
+            [user.pk, *ids], ids,
+            lambda: self.get_linked_ids(user, related_name, ids))
+
+    def update_related(self, user, related_name, counters, ids, delta):
+        if not ids:
+            return
+        user_counter, instance_counter = counters
+        if user_counter:
+            type(user).objects.filter(pk=user.pk).increment(
+                user_counter, delta * len(ids))
+        if instance_counter:
+            self.get_relation(related_name)[3].objects.filter(
+                pk__in=ids).increment(instance_counter, delta)
+        if related_name == 'in_shopping_cart':
+            ShoppingCartTotal.objects.add_recipes([user.id], ids, delta)
+        if related_name == 'subscribed' and settings.FEED_STRATEGY == 'fanout':
+            if delta > 0:
+                FeedEntry.objects.add_authors(user.id, ids)
+            else:
+                FeedEntry.objects.remove_authors(user.id, ids)
+
+    @transaction.atomic
+    def rel_entry_add_remove(self, request, related_name, counters,
                              add_error_msg, remove_error_msg):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
         user = request.user
-        related_model = getattr(user, related_name)
 
         if request.method == 'GET':
+            instance = self.get_object()
             if related_name == 'subscribed' and user == instance:
                 return Response(
                     {'errors': 'Нельзя подписаться на самого себя'},
                     status=HTTP_400_BAD_REQUEST)
-            if related_model.filter(id=instance.id).exists():
+            if not self.link(user, related_name, [instance.pk]):
                 return Response(
                     {'errors': add_error_msg},
                     status=HTTP_400_BAD_REQUEST)
-            related_model.add(instance)
-            return Response(serializer.data)
+            self.update_related(
+                user, related_name, counters, [instance.pk], 1)
+            return Response(self.get_serializer(instance).data)
 
-        if not related_model.filter(id=instance.id).exists():
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            pk = int(self.kwargs[lookup_url_kwarg])
+        except ValueError:
+            raise Http404
+        if not self.unlink(user, related_name, [pk]):
+            if not self.get_relation(related_name)[3].objects.filter(
+                    pk=pk).exists():
+                raise Http404
             return Response(
                 {'errors': remove_error_msg},
                 status=HTTP_400_BAD_REQUEST)
-        related_model.remove(instance)
+        self.update_related(user, related_name, counters, [pk], -1)
 
         return Response(status=HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def rel_entries_add_remove(self, request, related_name, counters):
+        serializer = IdListSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        found = set(self.get_relation(related_name)[3].objects.filter(
+            pk__in=ids).values_list('pk', flat=True))
+        forbidden = {user.pk} if related_name == 'subscribed' else set()
+
+        if request.method == 'POST':
+            affected = self.link(
+                user, related_name, sorted(found - forbidden))
+            delta, done, skipped = 1, 'added', 'already_added'
+        else:
+            affected = self.unlink(user, related_name, sorted(found))
+            delta, done, skipped = -1, 'removed', 'not_added'
+        self.update_related(
+            user, related_name, counters, sorted(affected), delta)
+
+        results = []
+        for pk in ids:
+            if pk not in found:
+                status = 'not_found'
+            elif pk in affected:
+                status = done
+            elif pk in forbidden and delta > 0:
+                status = 'forbidden'
+            else:
+                status = skipped
+            results.append({'id': pk, 'status': status})
+        return Response({'results': results})
@@ -1,10 +1,22 @@
+from itertools import islice
+
 from django.conf import settings
-from django.core.validators import MinValueValidator
+from django.core.exceptions import EmptyResultSet
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db.models import (
+    Case, Exists, F, IntegerField, OuterRef, Sum, Value, When, Window)
+from django.db.models.functions import RowNumber
+
+from .storage import ContentAddressedStorage
+
+MAX_TAG_BITS = 63
 
 
 class RecipeQuerySet(models.QuerySet):
+    def increment(self, field, delta=1):
+        return self.update(**{field: F(field) + delta})
+
     def add_user_annotations(self, user_id):
         favorites_model = self.model.fans.through
         buyers_model = self.model.buyers.through
@@ -21,6 +33,35 @@ class RecipeQuerySet(models.QuerySet):
             )
         )
 
+    def with_any_tags(self, mask):
+        return self.annotate(
+            any_tag_bits=F('tags_mask').bitand(mask)
+        ).filter(any_tag_bits__gt=0)
+
+    def with_all_tags(self, mask):
+        return self.annotate(
+            all_tag_bits=F('tags_mask').bitand(mask)
+        ).filter(all_tag_bits=mask)
+
+    def delete(self):
+        from .signals import skip_composition_totals
+        with skip_composition_totals(self.values_list('id', flat=True)):
+            return super().delete()
+
+    def latest_per_author(self, limit):
+        ranked = self.annotate(row_number=Window(
+            RowNumber(), partition_by=[F('author_id')],
+            order_by=[F('pub_date').desc(), F('id').desc()]
+        )).order_by().values('id', 'row_number')
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            return self.none()
+        return self.extra(
+            where=[f'{self.model._meta.db_table}.id IN ('
+                   f'SELECT id FROM ({sql}) ranked WHERE row_number <= %s)'],
+            params=[*params, limit])
+
 
 class Recipe(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL,
@@ -29,7 +70,8 @@ class Recipe(models.Model):
                                verbose_name='Автор')
     name = models.CharField('Имя', max_length=200, unique=True)
     image = models.ImageField('Изображение', max_length=200, upload_to='api/',
-                              blank=True, null=True)
+                              storage=ContentAddressedStorage(),
+                              blank=True, null=True, db_index=True)
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField('Ingredient', through='Composition',
                                          related_name='recipes',
@@ -39,6 +81,12 @@ class Recipe(models.Model):
         'Время приготовления', validators=[MinValueValidator(1)])
     pub_date = models.DateTimeField(
         'Опубликовано', auto_now_add=True, db_index=True)
+    fans_count = models.PositiveIntegerField(
+        'Фанатов', default=0, editable=False)
+    buyers_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False)
+    tags_mask = models.BigIntegerField(
+        'Битовая маска тегов', default=0, editable=False)
 
     objects = RecipeQuerySet.as_manager()
 
@@ -46,16 +94,28 @@ class Recipe(models.Model):
         verbose_name_plural = 'Рецепты'
         verbose_name = 'Рецепт'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx')
+        ]
 
     def __str__(self):
         return self.name[:15]
 
+    def delete(self, *args, **kwargs):
+        from .signals import skip_composition_totals
+        with skip_composition_totals([self.pk]):
+            return super().delete(*args, **kwargs)
+
 
 class Tag(models.Model):
     name = models.CharField('Имя', max_length=200, unique=True)
     slug = models.SlugField('Слаг', max_length=200, unique=True)
     color = models.CharField('Цветовой HEX-код', max_length=7,
                              null=True, unique=True)
+    bit = models.PositiveSmallIntegerField(
+        'Бит в маске рецепта', null=True, unique=True, editable=False,
+        validators=[MaxValueValidator(MAX_TAG_BITS - 1)])
 
     class Meta:
         verbose_name_plural = 'Теги'
@@ -65,6 +125,10 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def mask(self):
+        return 0 if self.bit is None else 1 << self.bit
+
 
 class Ingredient(models.Model):
     name = models.CharField('Имя', max_length=200, unique=True)
@@ -102,3 +166,178 @@ class Composition(models.Model):
 
     def __str__(self):
         return f'{self.recipe} - {self.ingredient}'
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    def add_amounts(self, user_ids, amounts):
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not amounts:
+            return
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+
+        self.bulk_create([
+            self.model(user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items() if amount > 0
+        ], ignore_conflicts=True)
+        self.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts.keys()
+        ).update(total_amount=F('total_amount') + Case(
+            *[When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()],
+            output_field=IntegerField()))
+        self.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts.keys(),
+            total_amount__lte=0
+        ).delete()
+
+    def add_recipes(self, user_ids, recipe_ids, sign=1):
+        amounts = Composition.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id').annotate(Sum('amount')).order_by()
+        self.add_amounts(user_ids, {
+            ingredient_id: sign * amount for ingredient_id, amount in amounts
+        })
+
+    def remove_recipes(self, user_ids, recipe_ids):
+        self.add_recipes(user_ids, recipe_ids, sign=-1)
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='shopping_cart_totals',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='shopping_cart_totals',
+                                   verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField('Количество', default=0)
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'Итоги списков покупок'
+        verbose_name = 'Итог списка покупок'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='user_ingredient_total_constraint')
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}'
+
+
+class SeedFingerprint(models.Model):
+    source = models.CharField('Источник', max_length=200, unique=True)
+    sha256 = models.CharField('SHA-256', max_length=64)
+    loaded = models.DateTimeField('Загружено', auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Отпечатки начальных данных'
+        verbose_name = 'Отпечаток начальных данных'
+        ordering = ['id']
+
+    def __str__(self):
+        return self.source
+
+
+class ChangeCounterQuerySet(models.QuerySet):
+    def bump(self, namespace):
+        if not self.filter(namespace=namespace).update(value=F('value') + 1):
+            self.get_or_create(namespace=namespace, defaults={'value': 1})
+
+    def get_value(self, namespace):
+        return self.filter(namespace=namespace).values_list(
+            'value', flat=True).first()
+
+
+class ChangeCounter(models.Model):
+    namespace = models.CharField('Пространство', max_length=50, unique=True)
+    value = models.BigIntegerField('Номер изменения', default=0)
+
+    objects = ChangeCounterQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'Счётчики изменений'
+        verbose_name = 'Счётчик изменений'
+        ordering = ['id']
+
+    def __str__(self):
+        return self.namespace
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    def add_rows(self, rows, batch_size=1000):
+        rows = iter(rows)
+        while True:
+            entries = [
+                self.model(user_id=user_id, recipe_id=recipe_id,
+                           author_id=author_id, pub_date=pub_date)
+                for user_id, recipe_id, author_id, pub_date
+                in islice(rows, batch_size)
+            ]
+            if not entries:
+                return
+            self.bulk_create(entries, ignore_conflicts=True)
+
+    def add_recipes(self, recipes, batch_size=1000):
+        subscriptions_model = self.model._meta.get_field(
+            'user').related_model.subscribed.through
+        self.add_rows(subscriptions_model.objects.filter(
+            to_user__recipes__in=recipes
+        ).values_list(
+            'from_user_id', 'to_user__recipes__id', 'to_user_id',
+            'to_user__recipes__pub_date'
+        ).iterator(batch_size), batch_size)
+
+    def add_authors(self, user_id, author_ids, batch_size=1000):
+        self.add_rows((
+            (user_id, *row) for row in Recipe.objects.filter(
+                author_id__in=author_ids
+            ).values_list('id', 'author_id', 'pub_date').iterator(batch_size)
+        ), batch_size)
+
+    def remove_authors(self, user_id, author_ids):
+        return self.filter(user_id=user_id, author_id__in=author_ids).delete()
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='feed_entries',
+                             verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='feed_entries',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL,
+                               on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор')
+    pub_date = models.DateTimeField('Опубликовано')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'Ленты подписок'
+        verbose_name = 'Запись ленты'
+        ordering = ['-pub_date', '-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='user_recipe_feed_constraint')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-id'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
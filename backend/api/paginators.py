@@ -1,6 +1,12 @@
 from rest_framework.pagination import (
+    CursorPagination as DRFCursorPagination,
     PageNumberPagination as DRFPageNumberPagination)
 
 
 class PageNumberPagination(DRFPageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(DRFCursorPagination):
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
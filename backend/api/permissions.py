@@ -11,7 +11,8 @@ class RecipePermissions(permissions.IsAuthenticatedOrReadOnly):
 
     def has_permission(self, request, view):
         if view.action in [
-            'shopping_cart', 'favorite', 'download_shopping_cart'
+            'shopping_cart', 'favorite', 'download_shopping_cart',
+            'shopping_cart_batch', 'favorite_batch', 'feed'
         ]:
             return bool(request.user and request.user.is_authenticated)
         return super().has_permission(request, view)
@@ -22,3 +23,9 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return bool(request.method in SAFE_METHODS or
                     request.user and request.user.is_authenticated and
                     request.user.is_admin)
+
+
+class IsAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and
+                    request.user.is_admin)
@@ -0,0 +1,51 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from rest_framework.renderers import BaseRenderer
+
+
+class EchoBuffer:
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(ABC, BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False)
+
+    @abstractmethod
+    def stream(self, ingredients):
+        pass
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.DictWriter(
+            EchoBuffer(), fieldnames=['name', 'amount', 'unit'])
+        yield writer.writeheader()
+        for ingredient in ingredients:
+            yield writer.writerow(ingredient)
+
+
+class JSONLinesShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield json.dumps(ingredient, ensure_ascii=False) + '\n'
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield '{name} ({unit}) — {amount}\n'.format(**ingredient)
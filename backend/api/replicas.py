@@ -0,0 +1,85 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'api:sticky:{}'
+
+routing_state = ContextVar('routing_state', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+        self.wrote = False
+
+
+@contextmanager
+def use_primary():
+    token = routing_state.set(None)
+    try:
+        yield
+    finally:
+        routing_state.reset(token)
+
+
+def get_sticky_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    return STICKY_KEY.format(
+        hashlib.sha1(authorization.encode()).hexdigest())
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = routing_state.get()
+        if (state is None or not state.use_replica or
+                not settings.DATABASE_REPLICAS or
+                connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return None
+        if state.replica is None:
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.use_replica = False
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = get_sticky_key(request)
+        state = RoutingState(
+            request.method in SAFE_METHODS and not (key and cache.get(key)))
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        if key and (state.wrote or request.method not in SAFE_METHODS):
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
@@ -0,0 +1,157 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import CharField, Value
+
+from .cache import get_versions
+from .instrumentation import timer
+from .replicas import use_primary
+from .models import Composition, Recipe
+from .serializers import RecipeBodySerializer
+from .thumbnails import get_thumbnail_urls
+
+User = get_user_model()
+
+BODY_KEY = 'api:recipe-body:{}'
+
+
+def get_body_keys(recipe_ids, request):
+    shared_versions = get_versions(['tag', 'ingredient', 'user'])
+    recipe_versions = get_versions(
+        [f'recipe:{recipe_id}' for recipe_id in recipe_ids])
+    base_url = request.build_absolute_uri('/')
+    keys = {}
+    for recipe_id, version in zip(recipe_ids, recipe_versions):
+        fingerprint = '|'.join([
+            base_url, str(recipe_id), *map(repr, shared_versions),
+            repr(version)])
+        keys[recipe_id] = BODY_KEY.format(
+            hashlib.sha1(fingerprint.encode()).hexdigest())
+    return keys
+
+
+def build_recipe_bodies(recipe_ids, request):
+    image_storage = Recipe._meta.get_field('image').storage
+    tags, ingredients = {}, {}
+
+    for recipe_id, *tag in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug', 'tag__color'
+    ).order_by('tag_id'):
+        tags.setdefault(recipe_id, []).append(
+            dict(zip(('id', 'name', 'slug', 'color'), tag)))
+
+    for recipe_id, *ingredient in Composition.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount'
+    ).order_by('id'):
+        ingredients.setdefault(recipe_id, []).append(
+            dict(zip(('id', 'name', 'measurement_unit', 'amount'),
+                     ingredient)))
+
+    bodies = []
+    for row in Recipe.objects.filter(id__in=recipe_ids).values(
+        'id', 'name', 'image', 'text', 'cooking_time', 'author_id',
+        'author__email', 'author__username', 'author__first_name',
+        'author__last_name'
+    ).order_by():
+        bodies.append({
+            'id': row['id'],
+            'tags': tags.get(row['id'], []),
+            'author': {
+                'id': row['author_id'],
+                'email': row['author__email'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+            },
+            'ingredients': ingredients.get(row['id'], []),
+            'name': row['name'],
+            'image': request.build_absolute_uri(
+                image_storage.url(row['image'])) if row['image'] else None,
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+            'thumbnails': get_thumbnail_urls(row['image'], request),
+        })
+    return bodies
+
+
+def serialize_recipe_bodies(recipe_ids, request):
+    recipes = Recipe.objects.filter(id__in=recipe_ids).select_related(
+        'author').prefetch_related('composition__ingredient', 'tags')
+    return RecipeBodySerializer(
+        recipes, many=True, context={'request': request}).data
+
+
+def get_recipe_bodies(recipe_ids, request):
+    keys = get_body_keys(recipe_ids, request)
+    bodies = cache.get_many(keys.values())
+
+    missing = [
+        recipe_id for recipe_id, key in keys.items() if key not in bodies]
+    if missing:
+        build = (build_recipe_bodies if settings.RECIPE_FAST_READ
+                 else serialize_recipe_bodies)
+        with use_primary():
+            fresh = {
+                keys[body['id']]: body for body in build(missing, request)
+            }
+        cache.set_many(fresh, settings.API_CACHE_TIMEOUT)
+        bodies.update(fresh)
+
+    return {
+        recipe_id: bodies[key]
+        for recipe_id, key in keys.items() if key in bodies
+    }
+
+
+def get_user_flags(user, recipe_ids, author_ids):
+    flags = {'favorited': set(), 'in_shopping_cart': set(),
+             'subscribed': set()}
+    if user.is_anonymous:
+        return flags
+
+    def kind(name):
+        return Value(name, output_field=CharField())
+
+    favorited = User.favorited.through.objects.filter(
+        user_id=user.id, recipe_id__in=recipe_ids
+    ).annotate(kind=kind('favorited')).values_list('kind', 'recipe_id')
+    in_shopping_cart = User.in_shopping_cart.through.objects.filter(
+        user_id=user.id, recipe_id__in=recipe_ids
+    ).annotate(kind=kind('in_shopping_cart')).values_list('kind', 'recipe_id')
+    subscribed = User.subscribed.through.objects.filter(
+        from_user_id=user.id, to_user_id__in=author_ids
+    ).annotate(kind=kind('subscribed')).values_list('kind', 'to_user_id')
+
+    for name, pk in favorited.union(in_shopping_cart, subscribed, all=True):
+        flags[name].add(pk)
+    return flags
+
+
+def add_user_flags(body, flags):
+    author = dict(body['author'], is_subscribed=(
+        body['author']['id'] in flags['subscribed']))
+    return dict(
+        body, author=author,
+        is_favorited=body['id'] in flags['favorited'],
+        is_in_shopping_cart=body['id'] in flags['in_shopping_cart'])
+
+
+def represent_recipes(recipes, request):
+    recipes = list(recipes)
+    recipe_ids = [recipe.id for recipe in recipes]
+    with timer('serialize'):
+        bodies = get_recipe_bodies(recipe_ids, request)
+        flags = get_user_flags(
+            request.user, recipe_ids,
+            {recipe.author_id for recipe in recipes})
+        return [
+            add_user_flags(bodies[recipe_id], flags)
+            for recipe_id in recipe_ids if recipe_id in bodies
+        ]
@@ -0,0 +1,119 @@
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+from .models import Composition, Ingredient, Recipe
+
+SEARCH_CONFIG = 'russian'
+SEARCH_TABLE = 'api_recipe_search'
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+RECIPES = Recipe._meta.db_table
+COMPOSITIONS = Composition._meta.db_table
+INGREDIENTS = Ingredient._meta.db_table
+
+
+def get_connection():
+    return connections[router.db_for_write(Recipe)]
+
+
+def get_ids_condition(column, recipe_ids):
+    if recipe_ids is None:
+        return '1 = 1', []
+    return f'{column} IN ({", ".join(["%s"] * len(recipe_ids))})', list(
+        recipe_ids)
+
+
+def update_search_index(recipe_ids=None):
+    if recipe_ids is not None and not recipe_ids:
+        return
+    connection = get_connection()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            where, params = get_ids_condition('recipe.id', recipe_ids)
+            cursor.execute(
+                f"UPDATE {RECIPES} AS recipe SET search_vector = "
+                f"setweight(to_tsvector(%s, recipe.name), 'A') || "
+                f"setweight(to_tsvector(%s, coalesce(("
+                f"SELECT string_agg(ingredient.name, ' ') "
+                f"FROM {COMPOSITIONS} composition "
+                f"JOIN {INGREDIENTS} ingredient "
+                f"ON ingredient.id = composition.ingredient_id "
+                f"WHERE composition.recipe_id = recipe.id), '')), 'B') || "
+                f"setweight(to_tsvector(%s, recipe.text), 'C') "
+                f"WHERE {where}",
+                [SEARCH_CONFIG] * 3 + params)
+        elif connection.vendor == 'sqlite':
+            where, params = get_ids_condition('rowid', recipe_ids)
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE {where}', params)
+            where, params = get_ids_condition('recipe.id', recipe_ids)
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text) "
+                f"SELECT recipe.id, recipe.name, coalesce(("
+                f"SELECT group_concat(ingredient.name, ' ') "
+                f"FROM {COMPOSITIONS} composition "
+                f"JOIN {INGREDIENTS} ingredient "
+                f"ON ingredient.id = composition.ingredient_id "
+                f"WHERE composition.recipe_id = recipe.id), ''), recipe.text "
+                f"FROM {RECIPES} recipe WHERE {where}",
+                params)
+
+
+def remove_from_search_index(recipe_ids):
+    connection = get_connection()
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    where, params = get_ids_condition('rowid', recipe_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {where}', params)
+
+
+def schedule_search_update(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+def get_fts_query(query):
+    terms = []
+    for term in re.findall(r'\w+', query.lower()):
+        if len(term) > 5:
+            term = term[:-2]
+        elif len(term) > 3:
+            term = term[:-1]
+        terms.append(f'"{term}"*')
+    return ' '.join(terms)
+
+
+def search_recipes(queryset, query):
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.extra(
+            select={'search_rank': f"ts_rank('{{0.1, 0.2, 0.4, 1.0}}', "
+                                   f'{RECIPES}.search_vector, {tsquery})'},
+            select_params=[query],
+            where=[f'{RECIPES}.search_vector @@ {tsquery}'],
+            params=[query],
+            order_by=['-search_rank', '-pub_date'])
+
+    if vendor == 'sqlite':
+        fts_query = get_fts_query(query)
+        if not fts_query:
+            return queryset
+        weights = ', '.join(map(str, SEARCH_WEIGHTS))
+        return queryset.extra(
+            select={'search_rank': (
+                f'SELECT -bm25({SEARCH_TABLE}, {weights}) '
+                f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'AND {SEARCH_TABLE}.rowid = {RECIPES}.id')},
+            select_params=[fts_query],
+            where=[f'{RECIPES}.id IN (SELECT rowid FROM {SEARCH_TABLE} '
+                   f'WHERE {SEARCH_TABLE} MATCH %s)'],
+            params=[fts_query],
+            order_by=['-search_rank', '-pub_date'])
+
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+        | Q(ingredients__name__icontains=query)).distinct()
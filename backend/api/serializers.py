@@ -1,31 +1,64 @@
 import base64
-import re
-from io import BytesIO
+import binascii
+import json
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
+from django.http import QueryDict
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework import serializers
 
-from users.serializers import UserSerializer
-from .models import Tag, Ingredient, Recipe, Composition
+from users.serializers import AuthorSerializer, UserSerializer
+from .cache import bump_versions, log_changes
+from .models import (
+    Tag, Ingredient, Recipe, Composition, ShoppingCartTotal)
+from .search import schedule_search_update
+from .signals import skip_composition_totals
+from .storage import get_digest
+from .thumbnails import get_thumbnail_urls
 
 User = get_user_model()
 
 
+def is_same_image(stored, uploaded):
+    if not stored or uploaded is None:
+        return False
+    try:
+        return (stored.storage.size(stored.name) == uploaded.size and
+                stored.storage.get_digest(stored.name) ==
+                get_digest(uploaded))
+    except OSError:
+        return False
+
+
 class ImageField(serializers.ImageField):
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
-        data = re.search(r'(?<=data:)(.+);base64,(.+)$', data)
-        if data is None:
+        if isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        if not isinstance(data, str):
             self.fail('invalid')
-        content_type, file = data.groups()
-        file_format = content_type.split('/')[1]
+        header, separator, encoded = data.partition(';base64,')
+        if not separator or not header.startswith('data:'):
+            self.fail('invalid')
+        content_type = header[len('data:'):]
+        file_format = content_type.split('/')[-1]
         file_name = self.context.get('request').data.get('name')
         full_name = f'{file_name}.{file_format}'
-        file = base64.b64decode(file)
-        file_size = len(file)
-        file = BytesIO(file)
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(0, len(encoded), self.chunk_size):
+                file.write(base64.b64decode(
+                    encoded[start:start + self.chunk_size]))
+        except binascii.Error:
+            self.fail('invalid')
+        file_size = file.tell()
+        file.seek(0)
         data = UploadedFile(
             file=file,
             name=full_name,
@@ -36,10 +69,36 @@ class ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class ThumbnailsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'image'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return get_thumbnail_urls(value.name, self.context.get('request'))
+
+
+class IdListSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=settings.RELATION_BATCH_LIMIT)
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    recipes_limit = serializers.IntegerField(min_value=1, required=False)
+
+
+def get_recipes_limit(request):
+    serializer = RecipesLimitSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data.get('recipes_limit')
+
+
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ['id', 'name', 'slug', 'color']
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -77,6 +136,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.BooleanField()
     is_in_shopping_cart = serializers.BooleanField()
+    thumbnails = ThumbnailsField()
 
     def get_ingredients(self, obj):
         return IngredientInRecipeSerializer(
@@ -84,7 +144,13 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ['pub_date']
+        exclude = ['pub_date', 'fans_count', 'buyers_count', 'tags_mask']
+
+
+class RecipeBodySerializer(RecipeSerializer):
+    author = AuthorSerializer()
+    is_favorited = None
+    is_in_shopping_cart = None
 
 
 class RecipeCreateUpdateSerializer(RecipeSerializer):
@@ -95,6 +161,17 @@ class RecipeCreateUpdateSerializer(RecipeSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = ImageField()
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = {**data.dict(), 'tags': data.getlist('tags')}
+            try:
+                data['ingredients'] = json.loads(data.get('ingredients', '[]'))
+            except ValueError:
+                raise serializers.ValidationError({
+                    'ingredients': 'Ингредиенты должны быть переданы в JSON'
+                })
+        return super().to_internal_value(data)
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
@@ -113,29 +190,64 @@ class RecipeCreateUpdateSerializer(RecipeSerializer):
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
+        tags = validated_data.pop('tags')
         author = self.context.get('request').user
         validated_data['author'] = author
-        recipe = super().update(instance, validated_data)
+        if is_same_image(instance.image, validated_data.get('image')):
+            del validated_data['image']
+        recipe = instance
+        recipe.previous_values = {
+            'image': recipe.image.name, 'author_id': recipe.author_id}
+
+        update_fields = []
+        for attr, value in validated_data.items():
+            field = Recipe._meta.get_field(attr)
+            if field.is_relation:
+                changed = getattr(recipe, field.attname) != value.pk
+            else:
+                changed = attr == 'image' or getattr(recipe, attr) != value
+            setattr(recipe, attr, value)
+            if changed:
+                update_fields.append(attr)
+        if update_fields:
+            recipe.save(update_fields=update_fields)
+        recipe.tags.set(tags)
 
         composition = {
             obj.ingredient_id: obj
             for obj in Composition.objects.filter(recipe=recipe)
         }
+        amounts = {}
         objs_update, objs_create = [], []
         for ingredient in ingredients:
-            if ingredient['ingredient'].id in composition:
-                obj = composition.pop(ingredient['ingredient'].id)
-                obj.amount = ingredient['amount']
-                objs_update.append(obj)
-            else:
+            ingredient_id = ingredient['ingredient'].id
+            obj = composition.pop(ingredient_id, None)
+            if obj is None:
+                amounts[ingredient_id] = ingredient['amount']
                 objs_create.append(
                     Composition(recipe=recipe,
-                                ingredient_id=ingredient['ingredient'].id,
+                                ingredient_id=ingredient_id,
                                 amount=ingredient['amount']))
+            elif obj.amount != ingredient['amount']:
+                amounts[ingredient_id] = ingredient['amount'] - obj.amount
+                obj.amount = ingredient['amount']
+                objs_update.append(obj)
         Composition.objects.bulk_update(objs_update, ['amount'])
         Composition.objects.bulk_create(objs_create)
-        Composition.objects.filter(
-            recipe=recipe, ingredient_id__in=composition.keys()).delete()
+        if composition:
+            with skip_composition_totals([recipe.pk]):
+                Composition.objects.filter(
+                    recipe=recipe,
+                    ingredient_id__in=composition.keys()).delete()
+            for ingredient_id, obj in composition.items():
+                amounts[ingredient_id] = -obj.amount
+        if objs_update or objs_create:
+            bump_versions('recipe', f'recipe:{recipe.pk}')
+        if objs_create:
+            log_changes('composition', [recipe.pk])
+            schedule_search_update([recipe.pk])
+        ShoppingCartTotal.objects.add_amounts(
+            recipe.buyers.values_list('id', flat=True), amounts)
 
         return recipe
 
@@ -183,16 +295,51 @@ class RecipeCreateUpdateSerializer(RecipeSerializer):
         return representation
 
 
+class IngredientImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=200)
+    amount = serializers.IntegerField(min_value=1)
+
+
+class RecipeImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=200)
+    author = serializers.CharField(max_length=150)
+    text = serializers.CharField()
+    cooking_time = serializers.IntegerField(min_value=1, max_value=32767)
+    image = serializers.CharField(
+        max_length=200, required=False, allow_blank=True, allow_null=True)
+    tags = serializers.ListField(child=serializers.CharField(max_length=200))
+    ingredients = IngredientImportSerializer(many=True)
+
+    def validate(self, attrs):
+        if not attrs['ingredients']:
+            raise serializers.ValidationError({
+                'ingredients': 'В рецепте должен быть как минимум 1 ингредиент'
+            })
+        ingredients = [
+            ingredient['name'] for ingredient in attrs['ingredients']]
+        if len(ingredients) != len(set(ingredients)):
+            raise serializers.ValidationError({
+                'ingredients': 'Ингредиенты должны быть уникальны'
+            })
+        if len(attrs['tags']) != len(set(attrs['tags'])):
+            raise serializers.ValidationError({
+                'tags': 'Тэги должны быть уникальны'
+            })
+        return attrs
+
+
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = ['id', 'name', 'image', 'thumbnails', 'cooking_time']
 
 
 class UserWithRecipesSerializer(DjoserUserSerializer):
     is_subscribed = serializers.BooleanField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -200,11 +347,9 @@ class UserWithRecipesSerializer(DjoserUserSerializer):
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count')
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = (obj.recipes.all()[:int(recipes_limit)] if recipes_limit
-                   else obj.recipes)
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = (obj.recipes.all()[:recipes_limit]
+                       if recipes_limit else obj.recipes)
         return RecipeMinifiedSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
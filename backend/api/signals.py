@@ -0,0 +1,329 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token_cache
+from .cache import bump_versions, log_changes
+from .models import (
+    Composition, FeedEntry, Ingredient, Recipe, ShoppingCartTotal, Tag)
+from .search import remove_from_search_index, schedule_search_update
+from .storage import release_images
+from .tags import get_free_bit, get_tags_masks, schedule_tag_index_update
+from .thumbnails import schedule_thumbnails
+
+User = get_user_model()
+
+
+untracked_recipes = ContextVar('untracked_recipes', default=frozenset())
+
+
+@contextmanager
+def skip_composition_totals(recipe_ids):
+    token = untracked_recipes.set(untracked_recipes.get() | set(recipe_ids))
+    try:
+        yield
+    finally:
+        untracked_recipes.reset(token)
+
+
+def add_to_buyers_totals(recipe_id, amounts):
+    ShoppingCartTotal.objects.add_amounts(
+        User.in_shopping_cart.through.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True), amounts)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_cart_totals(instance, **kwargs):
+    carts = User.in_shopping_cart.through.objects.filter(
+        recipe_id=instance.pk)
+    ShoppingCartTotal.objects.remove_recipes(
+        carts.values_list('user_id', flat=True), [instance.pk])
+    if instance.pk not in untracked_recipes.get():
+        carts.delete()
+
+
+@receiver(pre_save, sender=Composition)
+def remember_previous_composition(instance, raw, **kwargs):
+    if not raw and instance.pk is not None:
+        instance.previous_values = Composition.objects.filter(
+            pk=instance.pk).values('recipe_id', 'ingredient_id',
+                                   'amount').first()
+
+
+@receiver(post_save, sender=Composition)
+def update_composition_totals(instance, raw, **kwargs):
+    previous = vars(instance).pop('previous_values', None)
+    if raw:
+        return
+    amounts = {instance.ingredient_id: instance.amount}
+    if previous and previous['recipe_id'] == instance.recipe_id:
+        amounts[previous['ingredient_id']] = (
+            amounts.get(previous['ingredient_id'], 0) - previous['amount'])
+    elif previous:
+        add_to_buyers_totals(previous['recipe_id'], {
+            previous['ingredient_id']: -previous['amount']})
+    add_to_buyers_totals(instance.recipe_id, amounts)
+
+
+@receiver(post_delete, sender=Composition)
+def remove_composition_totals(instance, **kwargs):
+    if instance.recipe_id not in untracked_recipes.get():
+        add_to_buyers_totals(
+            instance.recipe_id, {instance.ingredient_id: -instance.amount})
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, raw, **kwargs):
+    if created and not raw:
+        User.objects.filter(pk=instance.author_id).increment('recipes_count')
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, raw, **kwargs):
+    if created and not raw and settings.FEED_STRATEGY == 'fanout':
+        FeedEntry.objects.add_recipes(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_delete, sender=Recipe)
+def decrement_recipe_counters(instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).increment('recipes_count', -1)
+    User.objects.filter(favorited=instance).increment('favorites_count', -1)
+
+
+@receiver(pre_delete, sender=User)
+def decrement_user_counters(instance, **kwargs):
+    User.objects.filter(subscribed=instance).increment(
+        'subscriptions_count', -1)
+    User.objects.filter(subscribers=instance).increment(
+        'subscribers_count', -1)
+    Recipe.objects.filter(fans=instance).increment('fans_count', -1)
+    Recipe.objects.filter(buyers=instance).increment('buyers_count', -1)
+
+
+RELATION_COUNTERS = {
+    User.favorited.through: (
+        'favorited', 'favorites_count', 'fans_count'),
+    User.in_shopping_cart.through: (
+        'in_shopping_cart', None, 'buyers_count'),
+    User.subscribed.through: (
+        'subscribed', 'subscriptions_count', 'subscribers_count'),
+}
+
+
+def get_linked_ids(related_name, instance, reverse, pk_set):
+    field = User._meta.get_field(related_name)
+    through = field.remote_field.through
+    source, target = (
+        through._meta.get_field(name).attname
+        for name in (field.m2m_field_name(), field.m2m_reverse_field_name()))
+    if reverse:
+        source, target = target, source
+    links = through.objects.filter(**{source: instance.pk})
+    if pk_set is not None:
+        links = links.filter(**{f'{target}__in': pk_set})
+    return set(links.values_list(target, flat=True))
+
+
+@receiver(m2m_changed, sender=User.favorited.through)
+@receiver(m2m_changed, sender=User.in_shopping_cart.through)
+@receiver(m2m_changed, sender=User.subscribed.through)
+def update_relation_counters(sender, instance, action, reverse, model,
+                             pk_set, **kwargs):
+    related_name, user_counter, target_counter = RELATION_COUNTERS[sender]
+    if action in ('pre_remove', 'pre_clear'):
+        instance.unlinked_ids = get_linked_ids(
+            related_name, instance, reverse, pk_set)
+        return
+    if action == 'post_add':
+        ids, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        ids, delta = vars(instance).pop('unlinked_ids', set()), -1
+    else:
+        return
+    if not ids:
+        return
+
+    instance_counter, related_counter = (
+        (target_counter, user_counter) if reverse else
+        (user_counter, target_counter))
+    if instance_counter:
+        type(instance).objects.filter(pk=instance.pk).increment(
+            instance_counter, delta * len(ids))
+    if related_counter:
+        model.objects.filter(pk__in=ids).increment(related_counter, delta)
+    if related_name == 'in_shopping_cart':
+        user_ids, recipe_ids = (
+            (ids, [instance.pk]) if reverse else ([instance.pk], ids))
+        ShoppingCartTotal.objects.add_recipes(user_ids, recipe_ids, delta)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def bump_recipe_version(instance, **kwargs):
+    bump_versions('recipe', f'recipe:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Composition)
+def bump_composition_recipe_version(instance, **kwargs):
+    bump_versions('recipe', f'recipe:{instance.recipe_id}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_tagged_recipe_version(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_versions('recipe', f'recipe:{instance.pk}')
+    elif pk_set is None:
+        bump_versions('recipe', 'tag')
+    else:
+        bump_versions('recipe', *[
+            f'recipe:{recipe_id}' for recipe_id in pk_set])
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def bump_tag_version(**kwargs):
+    bump_versions('tag')
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def bump_ingredient_version(**kwargs):
+    bump_versions('ingredient')
+
+
+@receiver([post_save, post_delete], sender=User)
+def bump_user_version(update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_versions('user')
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_token_cache(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    invalidate_token_cache(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def create_thumbnails(instance, raw, update_fields=None, **kwargs):
+    if (instance.image and not raw and
+            (update_fields is None or 'image' in update_fields)):
+        image_name = instance.image.name
+        transaction.on_commit(lambda: schedule_thumbnails(image_name))
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_previous_values(instance, raw, update_fields=None, **kwargs):
+    if (not raw and instance.pk is not None and
+            not hasattr(instance, 'previous_values') and
+            (update_fields is None or
+             {'image', 'author', 'author_id'} & set(update_fields))):
+        instance.previous_values = Recipe.objects.filter(
+            pk=instance.pk).values('image', 'author_id').first()
+
+
+@receiver(post_save, sender=Recipe)
+def apply_previous_values(instance, **kwargs):
+    previous = vars(instance).pop('previous_values', None)
+    if not previous:
+        return
+    name = previous['image']
+    if name and name != instance.image.name:
+        transaction.on_commit(lambda: release_images([name]))
+    if previous['author_id'] != instance.author_id:
+        User.objects.filter(pk=previous['author_id']).increment(
+            'recipes_count', -1)
+        User.objects.filter(pk=instance.author_id).increment('recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: release_images([name]))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_index(instance, raw, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or
+                    {'name', 'text'} & set(update_fields)):
+        schedule_search_update([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_search_index(instance, **kwargs):
+    remove_from_search_index([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Composition)
+def update_composition_search_index(instance, raw=False, **kwargs):
+    if not raw:
+        schedule_search_update([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_index(instance, raw, **kwargs):
+    if not raw:
+        schedule_search_update(instance.in_composition.values_list(
+            'recipe_id', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def log_recipe_composition_change(instance, raw=False, update_fields=None,
+                                  **kwargs):
+    if not raw and update_fields is None:
+        log_changes('composition', [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Composition)
+def log_composition_change(instance, raw=False, **kwargs):
+    if not raw:
+        log_changes('composition', [instance.recipe_id])
+
+
+@receiver(pre_save, sender=Tag)
+def assign_tag_bit(instance, raw, **kwargs):
+    if instance.bit is None and not raw:
+        instance.bit = get_free_bit()
+
+
+@receiver(post_save, sender=Tag)
+def create_tag_index(instance, **kwargs):
+    if instance.bit is not None:
+        schedule_tag_index_update(instance.bit, create=True)
+
+
+@receiver(pre_delete, sender=Tag)
+def clear_tag_bit(instance, **kwargs):
+    if instance.bit is not None:
+        Recipe.objects.with_any_tags(instance.mask).update(
+            tags_mask=F('tags_mask').bitand(~instance.mask))
+        schedule_tag_index_update(instance.bit, create=False)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Recipe.objects.filter(pk=instance.pk).update(
+            tags_mask=get_tags_masks([instance.pk])[instance.pk])
+    elif instance.bit is not None:
+        recipes = (Recipe.objects.with_any_tags(instance.mask)
+                   if pk_set is None else
+                   Recipe.objects.filter(pk__in=pk_set))
+        if action == 'post_add':
+            recipes.update(tags_mask=F('tags_mask').bitor(instance.mask))
+        else:
+            recipes.update(tags_mask=F('tags_mask').bitand(~instance.mask))
@@ -0,0 +1,62 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import router
+
+from .thumbnails import get_storage, get_thumbnail_names
+
+DIGEST_PATTERN = re.compile(r'(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})\.\w+$')
+
+
+def get_digest(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_content_name(self, name, content):
+        digest = get_digest(content)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def save_derived(self, name, content):
+        return super().save(name, content)
+
+    def get_digest(self, name):
+        match = DIGEST_PATTERN.search(name)
+        if match:
+            return match.group(1)
+        with self.open(name) as file:
+            return get_digest(file)
+
+
+def release_images(names):
+    from .models import Recipe
+    names = set(filter(None, names))
+    if not names:
+        return
+    recipes = Recipe.objects.using(router.db_for_write(Recipe))
+    referenced = set(recipes.filter(
+        image__in=names).values_list('image', flat=True))
+    storage = get_storage()
+    for name in names - referenced:
+        if recipes.filter(image=name).exists():
+            continue
+        for path in (name, *get_thumbnail_names(name)):
+            storage.delete(path)
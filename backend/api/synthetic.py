@@ -0,0 +1,147 @@
+import random
+from io import StringIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+
+from .cache import reset_changes
+from .models import Composition, Ingredient, Recipe, Tag
+from .search import update_search_index
+
+User = get_user_model()
+
+PASSWORD = 'synthetic-password'
+
+
+def get_cum_weights(count, skew):
+    if not skew:
+        return None
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def get_count(rng, mean, skew):
+    if not skew:
+        return mean
+    return round(rng.expovariate(1 / mean)) if mean else 0
+
+
+def pick(rng, population, count, cum_weights=None):
+    count = min(count, len(population))
+    if cum_weights is None:
+        return rng.sample(population, count)
+    chosen = set()
+    while len(chosen) < count:
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=count - len(chosen)))
+    return sorted(chosen)
+
+
+def insert(model, objects, batch_size=None):
+    if objects and batch_size:
+        batch_size = min(batch_size, connection.ops.bulk_batch_size(
+            [field.name for field in model._meta.concrete_fields], objects))
+    model.objects.bulk_create(objects, batch_size=batch_size)
+
+
+def generate_dataset(users=20, recipes=100, ingredients=50, tags=5,
+                     ingredients_per_recipe=5, subscriptions_per_user=5,
+                     favorites_per_user=10, cart_per_user=3, skew=0.0,
+                     seed=0, batch_size=None):
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    insert(Tag, [
+        Tag(name=f'Тег {index}', slug=f'tag-{index}',
+            color=f'#{index:06X}', bit=index)
+        for index in range(tags)
+    ])
+    insert(Ingredient, [
+        Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+        for index in range(ingredients)
+    ], batch_size)
+    insert(User, [
+        User(username=f'user{index}', email=f'user{index}@example.com',
+             first_name='Имя', last_name='Фамилия', password=password)
+        for index in range(users)
+    ], batch_size)
+
+    tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+    tag_bits = dict(Tag.objects.values_list('id', 'bit'))
+    ingredient_ids = list(Ingredient.objects.order_by('id').values_list(
+        'id', flat=True))
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    tag_weights = get_cum_weights(len(tag_ids), skew)
+    ingredient_weights = get_cum_weights(len(ingredient_ids), skew)
+    user_weights = get_cum_weights(len(user_ids), skew)
+
+    if user_weights is None:
+        author_ids = [user_ids[index % users] for index in range(recipes)]
+    else:
+        author_ids = sorted(rng.choices(
+            user_ids, cum_weights=user_weights, k=recipes))
+    recipe_tags = []
+    objects = []
+    for index, author_id in enumerate(author_ids):
+        chosen = pick(rng, tag_ids, rng.randint(1, 2), tag_weights)
+        recipe_tags.append(chosen)
+        objects.append(Recipe(
+            author_id=author_id, name=f'Рецепт {author_id}-{index}',
+            text='Синтетический рецепт', cooking_time=rng.randint(1, 120),
+            tags_mask=sum(1 << tag_bits[pk] for pk in chosen)))
+    insert(Recipe, objects, batch_size)
+    recipe_ids = list(Recipe.objects.order_by('id').values_list(
+        'id', flat=True))
+    recipe_weights = get_cum_weights(len(recipe_ids), skew)
+
+    insert(Composition, [
+        Composition(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in pick(
+            rng, ingredient_ids,
+            max(get_count(rng, ingredients_per_recipe, skew), 1),
+            ingredient_weights)
+    ], batch_size)
+    tags_model = Recipe.tags.through
+    insert(tags_model, [
+        tags_model(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id, chosen in zip(recipe_ids, recipe_tags)
+        for tag_id in chosen
+    ], batch_size)
+
+    subscriptions_model = User.subscribed.through
+    favorites_model = User.favorited.through
+    buyers_model = User.in_shopping_cart.through
+    subscriptions, favorites, buyers = [], [], []
+    for user_id in user_ids:
+        count = get_count(rng, subscriptions_per_user, skew)
+        subscriptions.extend(
+            subscriptions_model(from_user_id=user_id, to_user_id=author_id)
+            for author_id in [
+                pk for pk in pick(rng, user_ids, count + 1, user_weights)
+                if pk != user_id
+            ][:count])
+        favorites.extend(
+            favorites_model(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in pick(
+                rng, recipe_ids, get_count(rng, favorites_per_user, skew),
+                recipe_weights))
+        buyers.extend(
+            buyers_model(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in pick(
+                rng, recipe_ids, get_count(rng, cart_per_user, skew),
+                recipe_weights))
+    insert(subscriptions_model, subscriptions, batch_size)
+    insert(favorites_model, favorites, batch_size)
+    insert(buyers_model, buyers, batch_size)
+
+    call_command('reconcile_counters', stdout=StringIO())
+    call_command('rebuild_shopping_cart_totals', stdout=StringIO())
+    if settings.FEED_STRATEGY == 'fanout':
+        call_command('rebuild_feed', stdout=StringIO())
+    update_search_index()
+    reset_changes('composition')
@@ -0,0 +1,46 @@
+from django.db import connections, router, transaction
+
+from .models import MAX_TAG_BITS, Recipe, Tag
+
+RECIPES = Recipe._meta.db_table
+
+
+def get_tag_index_name(bit):
+    return f'recipe_tag_{bit}_idx'
+
+
+def get_free_bit():
+    used = set(Tag.objects.exclude(bit=None).values_list('bit', flat=True))
+    return next((bit for bit in range(MAX_TAG_BITS) if bit not in used), None)
+
+
+def get_tags_masks(recipe_ids=None):
+    tags = Recipe.tags.through.objects.exclude(tag__bit=None)
+    if recipe_ids is not None:
+        tags = tags.filter(recipe_id__in=recipe_ids)
+    masks = dict.fromkeys(recipe_ids or (), 0)
+    for recipe_id, bit in tags.values_list(
+            'recipe_id', 'tag__bit').iterator():
+        masks[recipe_id] = masks.get(recipe_id, 0) | 1 << bit
+    return masks
+
+
+def update_tag_index(bit, create):
+    connection = connections[router.db_for_write(Recipe)]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    name = get_tag_index_name(bit)
+    concurrently = ' CONCURRENTLY' if (
+        connection.vendor == 'postgresql'
+        and connection.get_autocommit()) else ''
+    sql = (
+        f'CREATE INDEX{concurrently} IF NOT EXISTS {name} '
+        f'ON {RECIPES} (pub_date DESC, id DESC) '
+        f'WHERE (tags_mask & {1 << bit}) > 0'
+        if create else f'DROP INDEX{concurrently} IF EXISTS {name}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+
+
+def schedule_tag_index_update(bit, create):
+    transaction.on_commit(lambda: update_tag_index(bit, create))
@@ -0,0 +1,191 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Prefetch
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+
+from .models import Composition, Ingredient, Recipe, Tag
+from .representations import (
+    add_user_flags, build_recipe_bodies, get_user_flags,
+    serialize_recipe_bodies)
+from .serializers import RecipeSerializer
+from .thumbnails import get_storage, get_thumbnail_names, get_thumbnail_urls
+
+User = get_user_model()
+
+
+class RecipeRepresentationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author', password='1',
+            first_name='Автор', last_name='Рецептов')
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader', password='1',
+            first_name='Читатель', last_name='Рецептов')
+        breakfast = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#E26C2D')
+        dinner = Tag.objects.create(
+            name='Ужин', slug='dinner', color='#49B64E')
+        egg = Ingredient.objects.create(name='яйцо', measurement_unit='шт')
+        milk = Ingredient.objects.create(name='молоко', measurement_unit='мл')
+
+        cls.full = Recipe.objects.create(
+            author=cls.author, name='Омлет', text='Взбить и пожарить',
+            cooking_time=10, image='api/omelette.png')
+        cls.full.tags.set([dinner, breakfast])
+        Composition.objects.bulk_create([
+            Composition(recipe=cls.full, ingredient=milk, amount=100),
+            Composition(recipe=cls.full, ingredient=egg, amount=3),
+        ])
+        cls.empty = Recipe.objects.create(
+            author=cls.author, name='Пустой', text='Ничего',
+            cooking_time=1, image='api/empty.png')
+        cls.imageless = Recipe.objects.create(
+            author=cls.reader, name='Без фото', text='Сварить',
+            cooking_time=5, image='')
+        cls.imageless.tags.set([breakfast])
+        Composition.objects.create(
+            recipe=cls.imageless, ingredient=egg, amount=2)
+
+        cls.reader.subscribed.add(cls.author)
+        cls.reader.favorited.add(cls.full)
+        cls.reader.in_shopping_cart.add(cls.full, cls.imageless)
+        cls.recipe_ids = [cls.full.id, cls.empty.id, cls.imageless.id]
+
+    def get_request(self, user):
+        request = Request(RequestFactory().get(
+            '/', HTTP_HOST=settings.ALLOWED_HOSTS[0].replace('*', 'localhost')
+        ))
+        request.user = user
+        return request
+
+    def get_reference(self, request):
+        user_id = request.user.id
+        authors = User.objects.add_is_subscribed_annotation(user_id)
+        recipes = Recipe.objects.filter(
+            id__in=self.recipe_ids
+        ).prefetch_related(
+            Prefetch('author', queryset=authors),
+            'composition__ingredient', 'tags'
+        ).add_user_annotations(user_id)
+        return RecipeSerializer(
+            recipes, many=True, context={'request': request}).data
+
+    def get_fast(self, request):
+        bodies = build_recipe_bodies(self.recipe_ids, request)
+        flags = get_user_flags(
+            request.user, self.recipe_ids,
+            {body['author']['id'] for body in bodies})
+        return [add_user_flags(body, flags) for body in bodies]
+
+    def assertSameRecipes(self, expected, actual):
+        self.assertEqual(
+            {item['id']: json.loads(json.dumps(item)) for item in expected},
+            {item['id']: json.loads(json.dumps(item)) for item in actual})
+
+    def test_bodies_match_serializer(self):
+        request = self.get_request(AnonymousUser())
+        self.assertSameRecipes(
+            serialize_recipe_bodies(self.recipe_ids, request),
+            build_recipe_bodies(self.recipe_ids, request))
+
+    def test_anonymous_representation_matches_serializer(self):
+        request = self.get_request(AnonymousUser())
+        self.assertSameRecipes(
+            self.get_reference(request), self.get_fast(request))
+
+    def test_user_representation_matches_serializer(self):
+        request = self.get_request(self.reader)
+        fast = self.get_fast(request)
+        self.assertSameRecipes(self.get_reference(request), fast)
+        flags = {item['id']: item for item in fast}
+        self.assertTrue(flags[self.full.id]['is_favorited'])
+        self.assertTrue(flags[self.imageless.id]['is_in_shopping_cart'])
+        self.assertTrue(flags[self.full.id]['author']['is_subscribed'])
+
+    def test_empty_relations_and_image(self):
+        request = self.get_request(self.reader)
+        bodies = {
+            body['id']: body
+            for body in build_recipe_bodies(self.recipe_ids, request)
+        }
+        self.assertEqual(bodies[self.empty.id]['tags'], [])
+        self.assertEqual(bodies[self.empty.id]['ingredients'], [])
+        self.assertIsNone(bodies[self.imageless.id]['image'])
+        self.assertIsNone(bodies[self.imageless.id]['thumbnails'])
+
+
+class RecipeTagFilterTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@foodgram.ru', username='author', password='1')
+        breakfast = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#E26C2D')
+        unindexed = Tag.objects.create(
+            name='Без бита', slug='unindexed', color='#49B64E')
+        Tag.objects.filter(pk=unindexed.pk).update(bit=None)
+        cls.both = Recipe.objects.create(
+            author=author, name='Оба тега', text='Текст', cooking_time=5)
+        cls.both.tags.set([breakfast, unindexed])
+        cls.unindexed = Recipe.objects.create(
+            author=author, name='Без бита', text='Текст', cooking_time=5)
+        cls.unindexed.tags.set([unindexed])
+        cls.breakfast = Recipe.objects.create(
+            author=author, name='Завтрак', text='Текст', cooking_time=5)
+        cls.breakfast.tags.set([breakfast])
+
+    def get_ids(self, params):
+        response = self.client.get(reverse('recipe-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def test_any_tag_without_bit(self):
+        self.assertEqual(
+            self.get_ids({'tags': 'unindexed'}),
+            {self.both.id, self.unindexed.id})
+        self.assertEqual(
+            self.get_ids({'tags': ['unindexed', 'breakfast']}),
+            {self.both.id, self.unindexed.id, self.breakfast.id})
+
+    def test_all_tags_without_bit(self):
+        self.assertEqual(
+            self.get_ids({'tags_all': ['unindexed', 'breakfast']}),
+            {self.both.id})
+
+
+class ThumbnailUrlsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = get_storage()
+        self.image_name = 'api/omelette.png'
+
+    def get_urls(self):
+        return {
+            url for formats in get_thumbnail_urls(self.image_name).values()
+            for url in formats.values()
+        }
+
+    def test_missing_thumbnails_fall_back_to_image(self):
+        self.assertEqual(
+            self.get_urls(), {self.storage.url(self.image_name)})
+
+    def test_generated_thumbnails(self):
+        names = get_thumbnail_names(self.image_name)
+        for name in names:
+            self.storage.save_derived(name, ContentFile(b'thumbnail'))
+        self.assertEqual(
+            self.get_urls(), {self.storage.url(name) for name in names})
@@ -0,0 +1,99 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from .cache import bump_versions
+
+logger = logging.getLogger(__name__)
+
+THUMBNAILS_DIR = 'thumbnails'
+FORMATS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+
+_executor = None
+
+
+def get_storage():
+    from .models import Recipe
+    return Recipe._meta.get_field('image').storage
+
+
+def get_thumbnail_name(image_name, size, extension):
+    stem = os.path.splitext(image_name)[0]
+    return f'{THUMBNAILS_DIR}/{stem}_{size}.{extension}'
+
+
+def get_thumbnail_names(image_name):
+    return [
+        get_thumbnail_name(image_name, size, extension)
+        for size in settings.RECIPE_THUMBNAIL_SIZES
+        for extension, _ in FORMATS
+    ]
+
+
+def get_thumbnail_urls(image_name, request=None):
+    if not image_name:
+        return None
+    storage = get_storage()
+    ready = storage.exists(get_thumbnail_names(image_name)[-1])
+    urls = {}
+    for size in settings.RECIPE_THUMBNAIL_SIZES:
+        urls[str(size)] = {}
+        for extension, _ in FORMATS:
+            url = storage.url(
+                get_thumbnail_name(image_name, size, extension) if ready
+                else image_name)
+            urls[str(size)][extension] = (
+                request.build_absolute_uri(url) if request else url)
+    return urls
+
+
+def generate_thumbnails(image_name, force=False):
+    storage = get_storage()
+    names = get_thumbnail_names(image_name)
+    if not force and all(storage.exists(name) for name in names):
+        return
+
+    with storage.open(image_name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+
+    for size in settings.RECIPE_THUMBNAIL_SIZES:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size))
+        for extension, image_format in FORMATS:
+            content = BytesIO()
+            converted = (thumbnail.convert('RGB')
+                         if image_format == 'JPEG' else thumbnail)
+            converted.save(content, image_format, quality=85)
+            name = get_thumbnail_name(image_name, size, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save_derived(name, ContentFile(content.getvalue()))
+
+    from .models import Recipe
+    bump_versions('recipe', *(
+        f'recipe:{pk}' for pk in Recipe.objects.filter(
+            image=image_name).values_list('id', flat=True)))
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error('Не удалось создать миниатюры',
+                     exc_info=future.exception())
+
+
+def schedule_thumbnails(image_name):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS, initializer=django.setup)
+    _executor.submit(generate_thumbnails, image_name).add_done_callback(
+        log_failure)
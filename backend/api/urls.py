@@ -6,5 +6,6 @@ router = DefaultRouter()
 router.register('tags', views.TagViewSet)
 router.register('recipes', views.RecipeViewSet)
 router.register('ingredients', views.IngredientViewSet)
+router.register('metrics', views.MetricsViewSet, basename='metrics')
 
 urlpatterns = router.urls
@@ -1,34 +1,52 @@
-import csv
-
-from django.db.models import F, Prefetch, Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.response import Response
+from rest_framework.viewsets import ModelViewSet, ViewSet
 
-from users.models import User
+from .backends.pool import connection_metrics
 from .filters import RecipeFilter, IngredientFilter
-from .mixins import RelEntryAddRemoveMixin
-from .models import Tag, Recipe, Composition, Ingredient
-from .permissions import RecipePermissions, IsAdminOrReadOnly
+from .indexes import ingredient_index
+from .instrumentation import get_latency_histograms
+from .mixins import CachedResponseMixin, RelEntryAddRemoveMixin
+from .models import Tag, Recipe, Ingredient, ShoppingCartTotal, FeedEntry
+from .paginators import RecipeCursorPagination
+from .permissions import RecipePermissions, IsAdminOrReadOnly, IsAdmin
+from .renderers import (
+    CSVShoppingCartRenderer, JSONLinesShoppingCartRenderer,
+    TextShoppingCartRenderer)
+from .representations import represent_recipes
 from .serializers import (
     TagSerializer, RecipeSerializer, RecipeCreateUpdateSerializer,
     RecipeMinifiedSerializer, IngredientSerializer)
 
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = None
+    cache_namespaces = ('tag',)
 
 
-class RecipeViewSet(ModelViewSet, RelEntryAddRemoveMixin):
+class RecipeViewSet(CachedResponseMixin, ModelViewSet,
+                    RelEntryAddRemoveMixin):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [RecipePermissions]
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
+    cache_namespaces = ('recipe', 'tag', 'ingredient', 'user')
+    cache_anonymous_only = True
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator') and
+                self.request.query_params.get('pagination') == 'cursor'):
+            self._paginator = RecipeCursorPagination()
+        return super().paginator
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -38,56 +56,111 @@ class RecipeViewSet(ModelViewSet, RelEntryAddRemoveMixin):
         return RecipeSerializer
 
     def get_queryset(self):
-        user = self.request.user
-        user_queryset = User.objects.only(
-            'id', 'email', 'username', 'first_name', 'last_name'
-        ).add_is_subscribed_annotation(user.id)
-
-        return super().get_queryset().prefetch_related(Prefetch(
-            'author', queryset=user_queryset), 'composition',
-            'composition__ingredient', 'tags').add_user_annotations(user.id)
-
-    @action(detail=False, methods=['GET'])
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            return queryset.only('id', 'author_id', 'pub_date')
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(represent_recipes(queryset, request))
+        return self.get_paginated_response(represent_recipes(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(represent_recipes([self.get_object()], request)[0])
+
+    @action(detail=False, methods=['GET'], renderer_classes=[
+        CSVShoppingCartRenderer, JSONLinesShoppingCartRenderer,
+        TextShoppingCartRenderer])
     def download_shopping_cart(self, request, *args, **kwargs):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping cart.csv"')
-
-        writer = csv.DictWriter(
-            response, fieldnames=['name', 'amount', 'unit'])
-        writer.writeheader()
-
-        recipes = request.user.in_shopping_cart.values('id')
-        ingredients = Composition.objects.filter(
-            recipe__in=recipes).values(
+        renderer = request.accepted_renderer
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=request.user).values(
             name=F('ingredient__name'),
-            unit=F('ingredient__measurement_unit')).annotate(
-            amount=Sum('amount'))
+            unit=F('ingredient__measurement_unit'),
+            amount=F('total_amount')).order_by('name')
 
-        for ingredient in ingredients:
-            writer.writerow(ingredient)
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}')
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping cart.{renderer.format}"')
 
         return response
 
+    @action(detail=False, methods=['GET'])
+    def feed(self, request, *args, **kwargs):
+        paginator = RecipeCursorPagination()
+        if settings.FEED_STRATEGY == 'fanout':
+            entries = paginator.paginate_queryset(
+                FeedEntry.objects.filter(user=request.user).only(
+                    'id', 'recipe_id', 'author_id', 'pub_date'),
+                request, view=self)
+            page = [
+                Recipe(id=entry.recipe_id, author_id=entry.author_id)
+                for entry in entries
+            ]
+        else:
+            page = paginator.paginate_queryset(
+                Recipe.objects.filter(
+                    author__in=request.user.subscribed.values('id')
+                ).only('id', 'author_id', 'pub_date'),
+                request, view=self)
+        return paginator.get_paginated_response(
+            represent_recipes(page, request))
+
     @action(detail=True, methods=['GET', 'DELETE'])
     def shopping_cart(self, request, *args, **kwargs):
         return self.rel_entry_add_remove(
-            request, 'in_shopping_cart',
+            request, 'in_shopping_cart', counters=(None, 'buyers_count'),
             add_error_msg='Этот рецепт уже добавлен в корзину',
             remove_error_msg='Этого рецепта нет в корзине')
 
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='shopping_cart', url_name='shopping-cart-batch')
+    def shopping_cart_batch(self, request, *args, **kwargs):
+        return self.rel_entries_add_remove(
+            request, 'in_shopping_cart', counters=(None, 'buyers_count'))
+
     @action(detail=True, methods=['GET', 'DELETE'])
     def favorite(self, request, *args, **kwargs):
         return self.rel_entry_add_remove(
-            request, 'favorited',
+            request, 'favorited', counters=('favorites_count', 'fans_count'),
             add_error_msg='Этот рецепт уже добавлен в избранное',
             remove_error_msg='Этого рецепта нет в избранном')
 
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='favorite', url_name='favorite-batch')
+    def favorite_batch(self, request, *args, **kwargs):
+        return self.rel_entries_add_remove(
+            request, 'favorited', counters=('favorites_count', 'fans_count'))
+
 
-class IngredientViewSet(ModelViewSet):
+class IngredientViewSet(CachedResponseMixin, ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [IngredientFilter]
     search_fields = ['name']
     permission_classes = [IsAdminOrReadOnly]
     pagination_class = None
+    cache_namespaces = ('ingredient',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param)
+        if name is None:
+            return Response(ingredient_index.all())
+        return Response(ingredient_index.search(
+            name, limit=settings.INGREDIENT_SEARCH_LIMIT))
+
+
+class MetricsViewSet(ViewSet):
+    permission_classes = [IsAdmin]
+
+    def list(self, request, *args, **kwargs):
+        return Response(get_latency_histograms())
+
+    @action(detail=False, methods=['GET'])
+    def connections(self, request, *args, **kwargs):
+        return Response(connection_metrics.snapshot())
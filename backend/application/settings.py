@@ -1,6 +1,7 @@
 import os
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -47,6 +48,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if env.bool('PERFORMANCE_MIDDLEWARE', False):
+    MIDDLEWARE.insert(0, 'api.instrumentation.PerformanceMiddleware')
+
 ROOT_URLCONF = 'application.urls'
 
 TEMPLATES = [
@@ -69,15 +73,46 @@ WSGI_APPLICATION = 'application.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': env.str('DB_ENGINE', 'django.db.backends.postgresql'),
+        'ENGINE': env.str('DB_ENGINE', 'api.backends.postgresql'),
         'NAME': env.str('DB_NAME', 'postgres'),
         'USER': env.str('POSTGRES_USER', 'postgres'),
         'PASSWORD': env.str('POSTGRES_PASSWORD', 'postgres'),
         'HOST': env.str('DB_HOST', 'db'),
         'PORT': env.str('DB_PORT', '5432'),
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', True),
+        'CONN_IDLE_TIMEOUT': env.int('DB_CONN_IDLE_TIMEOUT', 60),
+        'POOL_SIZE': env.int('DB_POOL_SIZE', 0),
     }
 }
 
+DATABASE_REPLICAS = []
+for replica in [
+    *({'HOST': host} for host in env.list('DB_REPLICA_HOSTS', default=[])),
+    *({'NAME': name} for name in env.list('DB_REPLICA_NAMES', default=[])),
+]:
+    alias = f'replica_{len(DATABASE_REPLICAS)}'
+    DATABASES[alias] = {
+        **DATABASES['default'], **replica, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+if DATABASE_REPLICAS:
+    MIDDLEWARE.append('api.replicas.ReplicaRoutingMiddleware')
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', 10)
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+SHARED_CACHE = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+LOCAL_CACHE_MAX_TIMEOUT = env.int('LOCAL_CACHE_MAX_TIMEOUT', 5)
+
 AUTH_USER_MODEL = 'users.User'
 
 DJOSER = {
@@ -95,12 +130,47 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'api.paginators.PageNumberPagination',
     'PAGE_SIZE': 10
 }
 
+INGREDIENT_SEARCH_LIMIT = env.int('INGREDIENT_SEARCH_LIMIT', 50)
+
+API_CACHE_TIMEOUT = env.int(
+    'API_CACHE_TIMEOUT', 60 * 60 if SHARED_CACHE else 0)
+if not SHARED_CACHE and API_CACHE_TIMEOUT > LOCAL_CACHE_MAX_TIMEOUT:
+    raise ImproperlyConfigured(
+        f'API_CACHE_TIMEOUT={API_CACHE_TIMEOUT} требует общего кеша: '
+        f'задайте CACHE_URL (memcache://) или уменьшите таймаут до '
+        f'{LOCAL_CACHE_MAX_TIMEOUT}')
+
+RECIPE_FAST_READ = env.bool('RECIPE_FAST_READ', True)
+
+RECIPE_INDEX_TTL = env.int('RECIPE_INDEX_TTL', 5 * 60)
+
+RELATION_BATCH_LIMIT = env.int('RELATION_BATCH_LIMIT', 100)
+
+SLOW_REQUEST_THRESHOLD = env.int('SLOW_REQUEST_THRESHOLD', 500)
+
+LATENCY_WINDOW = env.int('LATENCY_WINDOW', 15)
+
+TOKEN_CACHE_SIZE = env.int('TOKEN_CACHE_SIZE', 1024)
+TOKEN_CACHE_TIMEOUT = env.int('TOKEN_CACHE_TIMEOUT', 60)
+TOKEN_CACHE_SHARED = env.bool('TOKEN_CACHE_SHARED', SHARED_CACHE)
+
+FEED_STRATEGY = env('FEED_STRATEGY', default='pull')
+
+RECIPE_THUMBNAIL_SIZES = env.list(
+    'RECIPE_THUMBNAIL_SIZES', cast=int, default=[160, 320, 640])
+THUMBNAIL_WORKERS = env.int('THUMBNAIL_WORKERS', 2)
+
+SEED_FIXTURES = env('SEED_FIXTURES', default=os.path.join(
+    BASE_DIR, 'fixtures.json'))
+SEED_INGREDIENTS = env('SEED_INGREDIENTS', default=os.path.join(
+    os.path.dirname(BASE_DIR), 'data', 'ingredients.csv'))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -1,9 +1,12 @@
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, F, OuterRef
 
 
 class UserQuerySet(models.QuerySet):
+    def increment(self, field, delta=1):
+        return self.update(**{field: F(field) + delta})
+
     def add_is_subscribed_annotation(self, user_id):
         favorites_model = self.model.subscribed.through
         return self.annotate(
@@ -40,6 +43,14 @@ class User(AbstractUser):
         verbose_name='Избранные рецепты')
     in_shopping_cart = models.ManyToManyField(
         'api.Recipe', related_name='buyers', verbose_name='В корзине')
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False)
+    subscriptions_count = models.PositiveIntegerField(
+        'Подписок', default=0, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'Любимых рецептов', default=0, editable=False)
 
     objects = CustomUserManager()
 
@@ -14,7 +14,8 @@ class UserPermissions(permissions.IsAuthenticatedOrReadOnly):
 
     def has_permission(self, request, view):
         if view.action in [
-            'subscriptions', 'subscribe', 'token_destroy'
+            'subscriptions', 'subscribe', 'subscribe_batch',
+            'token_destroy'
         ]:
             return bool(request.user and request.user.is_authenticated)
         if view.action == 'create':
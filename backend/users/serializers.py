@@ -17,6 +17,14 @@ class UserSerializer(DjoserUserSerializer):
                   'last_name', 'is_subscribed')
 
 
+class AuthorSerializer(UserSerializer):
+    is_subscribed = None
+
+    class Meta:
+        model = User
+        fields = ('id', 'email', 'username', 'first_name', 'last_name')
+
+
 class UserCreateSerializer(DjoserUserCreateSerializer):
     class Meta:
         model = User
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from api.models import Recipe
+
+User = get_user_model()
+
+
+class SubscriptionsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@foodgram.ru', username='reader', password='1')
+        cls.author = User.objects.create_user(
+            email='author@foodgram.ru', username='author', password='1')
+        for number in range(3):
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=5)
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+        self.url = reverse('user-subscriptions')
+
+    def test_no_subscriptions(self):
+        response = self.client.get(self.url, {'recipes_limit': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_recipes_limit(self):
+        self.reader.subscribed.add(self.author)
+        response = self.client.get(self.url, {'recipes_limit': 2})
+        self.assertEqual(response.status_code, 200)
+        author, = response.json()['results']
+        self.assertEqual(len(author['recipes']), 2)
+
+    def test_invalid_recipes_limit(self):
+        for recipes_limit in ('abc', '0', '-1'):
+            response = self.client.get(
+                self.url, {'recipes_limit': recipes_limit})
+            self.assertEqual(response.status_code, 400)
@@ -1,10 +1,14 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.conf import settings
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.decorators import action
+from rest_framework.response import Response
 
+from api.instrumentation import timer
 from api.mixins import RelEntryAddRemoveMixin
-from api.serializers import UserWithRecipesSerializer
+from api.models import Recipe
+from api.serializers import UserWithRecipesSerializer, get_recipes_limit
 from .permissions import UserPermissions
 
 User = get_user_model()
@@ -24,10 +28,11 @@ class UserViewSet(DjoserUserViewSet, RelEntryAddRemoveMixin):
     def get_queryset(self):
         user = self.request.user
         queryset = (
-            user.subscribed.prefetch_related('recipes')
-            if self.action == 'subscriptions' else super().get_queryset())
+            user.subscribed.all() if self.action == 'subscriptions'
+            else super().get_queryset())
         queryset = queryset.only(
-            'id', 'email', 'username', 'first_name', 'last_name'
+            'id', 'email', 'username', 'first_name', 'last_name',
+            'recipes_count'
         ).add_is_subscribed_annotation(user.id)
 
         if (settings.HIDE_USERS and self.action == "list"
@@ -41,13 +46,53 @@ class UserViewSet(DjoserUserViewSet, RelEntryAddRemoveMixin):
         user.is_subscribed = False
         return user
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        users = list(queryset) if page is None else page
+
+        with timer('serialize'):
+            data = self.get_serializer(users, many=True).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        with timer('serialize'):
+            data = self.get_serializer(instance).data
+        return Response(data)
+
     @action(detail=False, methods=['GET'])
     def subscriptions(self, request, *args, **kwargs):
-        return self.list(request, *args, **kwargs)
+        recipes_limit = get_recipes_limit(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        authors = list(queryset) if page is None else page
+
+        recipes = Recipe.objects.filter(author__in=authors)
+        if recipes_limit:
+            recipes = recipes.latest_per_author(recipes_limit)
+        prefetch_related_objects(authors, Prefetch(
+            'recipes', queryset=recipes, to_attr='latest_recipes'))
+
+        with timer('serialize'):
+            data = self.get_serializer(authors, many=True).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
 
     @action(detail=True, methods=['GET', 'DELETE'])
     def subscribe(self, request, *args, **kwargs):
         return self.rel_entry_add_remove(
             request, 'subscribed',
+            counters=('subscriptions_count', 'subscribers_count'),
             add_error_msg='Вы уже подписаны на этого пользователя',
             remove_error_msg='Вы не подписаны на этого пользователя')
+
+    @action(detail=False, methods=['POST', 'DELETE'],
+            url_path='subscribe', url_name='subscribe-batch')
+    def subscribe_batch(self, request, *args, **kwargs):
+        return self.rel_entries_add_remove(
+            request, 'subscribed',
+            counters=('subscriptions_count', 'subscribers_count'))